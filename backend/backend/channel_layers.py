@@ -0,0 +1,27 @@
+# backend/channel_layers.py
+
+# CHANNEL_LAYER_BACKEND values and the layer class each one selects
+BACKENDS = {
+    # Per-channel Redis lists; messages wait for a consumer that is briefly away
+    'redis': 'channels_redis.core.RedisChannelLayer',
+    # Redis pub/sub; lower latency, but nothing is kept for a consumer that
+    # isn't subscribed at the moment of sending
+    'redis_pubsub': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+    # This process only: a single web node, development and tests
+    'memory': 'channels.layers.InMemoryChannelLayer',
+}
+
+def channel_layer_config(backend, hosts):
+    """
+    CHANNEL_LAYERS['default'] for ``backend``. Both Redis layers shard
+    channels and groups across every URL in ``hosts``, so giving several
+    turns either into a multi-host layout.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown CHANNEL_LAYER_BACKEND {backend!r}, expected one of {', '.join(BACKENDS)}"
+        )
+    config = {'BACKEND': BACKENDS[backend]}
+    if backend != 'memory':
+        config['CONFIG'] = {'hosts': list(hosts)}
+    return config
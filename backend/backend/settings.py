@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 
+from .channel_layers import channel_layer_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -54,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'game.middleware.BroadcastBatchMiddleware',
 ]
 
 if DEBUG:
@@ -81,17 +84,33 @@ TEMPLATES = [
 
 ASGI_APPLICATION = 'backend.asgi.application'
 
+# 'redis', 'redis_pubsub' or 'memory' (backend/channel_layers.py). Give
+# CHANNEL_REDIS_HOSTS several comma separated URLs to shard across them
+CHANNEL_LAYER_BACKEND = os.environ.get('CHANNEL_LAYER_BACKEND', 'redis')
+CHANNEL_REDIS_HOSTS = os.environ.get('CHANNEL_REDIS_HOSTS', 'redis://redis:6379/0').split(',')
+
 CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
-        "CONFIG": {
-            "hosts": [("redis", 6379)],
-        },
-    },
+    "default": channel_layer_config(CHANNEL_LAYER_BACKEND, CHANNEL_REDIS_HOSTS),
 }
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Shared cache (scheduler metrics), reachable from web, worker and clock processes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_CACHE_URL', 'redis://redis:6379/1'),
+    }
+}
+
+# Clients allowed to read /api/metrics/ without being staff
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+# Reverse proxies (addresses or networks, e.g. the docker network nginx runs
+# in) whose X-Real-IP header gives the client's address; none by default
+TRUSTED_PROXIES = [
+    net for net in os.environ.get('TRUSTED_PROXIES', '').split(',') if net.strip()
+]
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
@@ -114,17 +133,72 @@ CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
+# Round and guessing deadlines are queued as ETA tasks when they are set
+# (game.utils.schedule_round_end / schedule_game_end). These sweeps are only
+# a safety net for wakeups lost by the broker. The entries keep their old
+# names: DatabaseScheduler stores them as PeriodicTask rows by name, and a
+# renamed entry would leave the old row running at the old interval.
 CELERY_BEAT_SCHEDULE = {
     'check-and-advance-rounds-every-5-seconds': {
         'task': 'game.tasks.run_round_check',
-        'schedule': 5.0,
+        'schedule': 30.0,
     },
     'check-and-end-games-every-10-seconds': {
         'task': 'game.tasks.run_game_end_check',
+        'schedule': 30.0,
+    },
+    # Outbox events are dispatched on commit; this picks up any whose
+    # dispatch task was lost
+    'dispatch-outbox-fallback': {
+        'task': 'game.tasks.dispatch_outbox',
         'schedule': 5.0,
     },
+    # Marks participants whose sockets are gone inactive (game.presence)
+    'sweep-presence': {
+        'task': 'game.tasks.sweep_presence',
+        'schedule': 15.0,
+    },
 }
 
+# Seconds between writes of buffered socket heartbeats to Participant.last_seen
+PRESENCE_FLUSH_INTERVAL = int(os.environ.get('PRESENCE_FLUSH_INTERVAL', '30'))
+# Where live socket presence is kept: 'redis' (shared by all web processes)
+# or 'memory' (this process only, for development)
+PRESENCE_BACKEND = os.environ.get('PRESENCE_BACKEND', 'redis')
+PRESENCE_REDIS_URL = os.environ.get('PRESENCE_REDIS_URL', 'redis://redis:6379/2')
+# A socket without a heartbeat for PRESENCE_TTL seconds no longer counts as
+# online; a participant offline for PRESENCE_GRACE_SECONDS is marked inactive
+PRESENCE_TTL = int(os.environ.get('PRESENCE_TTL', '45'))
+PRESENCE_GRACE_SECONDS = int(os.environ.get('PRESENCE_GRACE_SECONDS', '90'))
+
+# Let lobby sockets negotiate binary MessagePack frames (game.protocol);
+# broadcasts then carry both encodings through the channel layer. Off by
+# default: the lobby page doesn't offer the subprotocol yet
+SOCKET_COMPACT_PROTOCOL = os.environ.get('SOCKET_COMPACT_PROTOCOL', 'false').lower() == 'true'
+
+# Frames queued or not yet acknowledged per lobby socket before it counts as
+# slow; a socket that stays over it for SOCKET_SLOW_GRACE_SECONDS, or reaches
+# twice it, is closed
+SOCKET_SEND_QUEUE_LIMIT = int(os.environ.get('SOCKET_SEND_QUEUE_LIMIT', '100'))
+SOCKET_SLOW_GRACE_SECONDS = float(os.environ.get('SOCKET_SLOW_GRACE_SECONDS', '10'))
+
+# Record broadcasts in the OutboxMessage table with the surrounding
+# transaction and publish them from a Celery worker after commit, instead of
+# calling the channel layer inline
+BROADCAST_OUTBOX = os.environ.get('BROADCAST_OUTBOX', 'true').lower() == 'true'
+
+# What wakes sessions up at their deadlines: 'celery' queues an ETA task per
+# deadline, 'daemon' hands deadlines to the asyncio process started with
+# `manage.py run_game_clock`, which also sends the resulting broadcasts.
+GAME_CLOCK = os.environ.get('GAME_CLOCK', 'celery')
+
+# The round sweep splits due sessions into this many shards by a hash of the
+# room code, one task per shard. With a queue prefix set, shard N (and the
+# deadline tasks of its rooms) goes to queue "<prefix>N" so shards can be
+# given dedicated workers.
+ROUND_CHECK_SHARDS = int(os.environ.get('ROUND_CHECK_SHARDS', '4'))
+ROUND_CHECK_QUEUE_PREFIX = os.environ.get('ROUND_CHECK_QUEUE_PREFIX', '')
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
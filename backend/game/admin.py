@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     Character, GameSession, Participant,
-    QuestionCollection, Question, Round, Message, Guess
+    QuestionCollection, Question, Round, Message, Guess, OutboxMessage
 )
 
 admin.site.register(Character)
@@ -10,6 +10,7 @@ admin.site.register(Participant)
 admin.site.register(Round)
 admin.site.register(Message)
 admin.site.register(Guess)
+admin.site.register(OutboxMessage)
 
 @admin.register(QuestionCollection)
 class QuestionCollectionAdmin(admin.ModelAdmin):
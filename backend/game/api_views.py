@@ -1,14 +1,41 @@
 # game/api_views.py
 
-import random, string, uuid
+import ipaddress, random, string, uuid
 from datetime import timedelta
+from django.conf import settings
+from django.http import HttpResponse
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from .models import GameSession, Participant, QuestionCollection, Message, Round, Character
+from . import metrics
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import F, Q
-from .utils import broadcast_chat_message, broadcast_lobby_update, broadcast_round_update, send_system_message
+from .utils import (
+    broadcast_chat_message, broadcast_lobby_update, broadcast_round_update,
+    broadcast_player_patch, broadcast_player_left, broadcast_settings_patch,
+    send_system_message, schedule_round_end, build_question_deck, lobby_snapshot,
+    record_guesser, remove_guesser, record_answer, expected_answer_count,
+    guess_options_by_participant, chat_history, CHAT_HISTORY_PAGE, deactivate
+)
+
+def _parse_seq(value, default=0):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return default
+
+def client_ip(request):
+    """The caller's address: X-Real-IP if the request came through a trusted proxy."""
+    remote = request.META.get('REMOTE_ADDR', '')
+    try:
+        address = ipaddress.ip_address(remote)
+    except ValueError:
+        return remote
+    if any(address in ipaddress.ip_network(net.strip(), strict=False) for net in settings.TRUSTED_PROXIES):
+        return request.META.get('HTTP_X_REAL_IP', remote).strip()
+    return remote
 
 def generate_room_code(length=6):
     return ''.join(random.choices(string.ascii_uppercase, k=length))
@@ -74,6 +101,7 @@ def join_room(request):
         return Response({'error': 'Kambarys su tokiu kodu neegzistuoja.'}, status=404)
 
     participant = None
+    joined = collections_assigned = False
     participant_id = request.data.get('participant_id')
     provided_secret = request.data.get('secret', '').strip()
 
@@ -92,6 +120,7 @@ def join_room(request):
             game_session=session,
             defaults={'is_host': session.participants.count() == 0}
         )
+        joined = created
         # On first join, assign only public and own question collections
         if created and session.question_collections.count() == 0:
             cols = QuestionCollection.objects.filter(
@@ -101,6 +130,7 @@ def join_room(request):
             )
             session.question_collections.set(cols)
             session.save()
+            collections_assigned = True
 
     # Reconnect flow
     if not participant and participant_id and provided_secret:
@@ -141,6 +171,7 @@ def join_room(request):
             game_session=session,
             is_host=is_host
         )
+        joined = True
 
         # On first guest join, assign only public collections
         if session.question_collections.count() == 0:
@@ -150,41 +181,16 @@ def join_room(request):
             )
             session.question_collections.set(public_cols)
             session.save()
+            collections_assigned = True
 
-    broadcast_lobby_update(session)
+    # Reconnects change nothing the room can see
+    if joined:
+        broadcast_player_patch(session, participant, 'player_added')
+    if collections_assigned:
+        broadcast_settings_patch(session)
 
-    players = [{
-        'id': p.id,
-        'username': p.user.username if p.user else p.guest_name,
-        'characterSelected': bool(p.assigned_character),
-        'is_host': p.is_host,
-        'is_npc': p.is_npc
-    } for p in session.participants.all().order_by('joined_at')]
-
-    messages = []
-    for msg in Message.objects.filter(round__game_session=session).order_by('sent_at'):
-        if msg.participant and msg.participant.assigned_character:
-            char = msg.participant.assigned_character
-            img = char.image.url if char.image else None
-            name = char.name
-        else:
-            img = None
-            name = 'System' if msg.message_type == 'system' else None
-
-        messages.append({
-            'id': msg.id,
-            'text': msg.text,
-            'sentAt': msg.sent_at.isoformat(),
-            'roundNumber': msg.round.round_number,
-            'system': (msg.message_type == 'system'),
-            'characterImage': img,
-            'characterName': name,
-        })
-
-    collections_list = list(
-        session.question_collections.filter(is_deleted=False)
-        .values('id', 'name')
-    )
+    # Only what the client hasn't seen; it pages on via chat_history
+    history = chat_history(session, _parse_seq(request.data.get('after_seq')))
 
     current_round = None
     if session.status == 'in_progress':
@@ -198,20 +204,15 @@ def join_room(request):
                 'end_time': cur.end_time.isoformat(),
             }
 
+    # Lobby fields come from the same cached snapshot as the socket
     return Response({
-        'code': session.code,
-        'status': session.status,
-        'round_length': session.round_length,
-        'round_count': session.round_count,
-        'guess_timer': session.guess_timer,
-        'guess_deadline': session.guess_deadline.isoformat() if session.guess_deadline else None,
-        'players': players,
+        **lobby_snapshot(session),
         'participant_id': participant.id,
         'secret': participant.secret,
         'is_host': participant.is_host,
         'current_round': current_round,
-        'messages': messages,
-        'question_collections': collections_list
+        'messages': history['messages'],
+        'messages_has_more': history['has_more'],
     })
 
 @api_view(['POST'])
@@ -261,6 +262,10 @@ def update_settings(request):
     session.round_length = round_length
     session.round_count = round_count
 
+    early_round_end = request.data.get('early_round_end')
+    if early_round_end is not None:
+        session.early_round_end = early_round_end in (True, 'true', 'True', '1', 1)
+
     selected_ids = request.data.get('selectedCollections')
     if selected_ids is not None:
         # only public and hosts collections
@@ -288,8 +293,7 @@ def update_settings(request):
 
     session.save()
 
-    from .utils import broadcast_lobby_update
-    broadcast_lobby_update(session)
+    broadcast_settings_patch(session)
     
     return Response({
          'code': session.code,
@@ -297,6 +301,7 @@ def update_settings(request):
          'round_length': session.round_length,
          'round_count': session.round_count,
          'guess_timer': session.guess_timer,
+         'early_round_end': session.early_round_end,
          'question_collections': list(session.question_collections.values('id', 'name'))
     })
 
@@ -318,12 +323,15 @@ def leave_room(request):
          return Response({'error': 'Netinkamas slaptažodis.'}, status=403)
 
     was_host = participant.is_host
+    left_id = participant.id
 
     if session.status == 'pending':
          participant.delete()
     else:
-         participant.is_active = False
-         participant.save()
+         # Only the request that actually deactivates them stops waiting for
+         # their guesses; a repeated leave must not count twice
+         if deactivate(participant):
+              remove_guesser(session, participant)
 
     remaining = session.participants.filter(is_active=True)
     human_remaining = remaining.filter(is_npc=False)
@@ -334,16 +342,16 @@ def leave_room(request):
             new_host = human_remaining.order_by('joined_at').first()
             new_host.is_host = True
             new_host.save()
-        from .utils import broadcast_lobby_update
-        broadcast_lobby_update(session)
+        broadcast_player_left(session, left_id, participant)
+        if was_host:
+            broadcast_player_patch(session, new_host)
         return Response({'message': 'Išėjote iš kambario.'})
     else:
         if session.status == 'pending':
             session.delete()
             return Response({'message': 'Išėjote iš kambario.'})
         else:
-            from .utils import broadcast_lobby_update
-            broadcast_lobby_update(session)
+            broadcast_player_left(session, left_id, participant)
             return Response({'message': 'Išėjote iš kambario.'})
 
 @api_view(['GET'])
@@ -411,7 +419,7 @@ def update_question_collections(request):
 
     session.question_collections.set(valid_collections)
     session.save()
-    broadcast_lobby_update(session)
+    broadcast_settings_patch(session)
 
     collections_list = list(session.question_collections.values('id', 'name'))
     return Response({
@@ -473,8 +481,7 @@ def select_character(request):
     participant.assigned_character = character
     participant.save()
     
-    from .utils import broadcast_lobby_update
-    broadcast_lobby_update(session)
+    broadcast_player_patch(session, participant)
     
     return Response({'message': 'Personažas pasirinktas.'})
 
@@ -523,8 +530,7 @@ def create_character(request):
     participant.assigned_character = new_character
     participant.save()
     
-    from .utils import broadcast_lobby_update
-    broadcast_lobby_update(session)
+    broadcast_player_patch(session, participant)
     
     return Response({'message': 'Personažas sukurtas ir pasirinktas.', 'character_id': new_character.id})
 
@@ -585,46 +591,42 @@ def start_game(request):
     if session.participants.filter(assigned_character__isnull=True).exists():
          return Response({'error': 'Kiekvienas dalyvis privalo turėti personažą.'}, status=400)
     
-    live_cols = session.question_collections.filter(is_deleted=False)
-    total_questions = sum(
-        collection.questions.filter(is_deleted=False).count()
-        for collection in live_cols
-    )
-    if total_questions < session.round_count:
+    deck = build_question_deck(session)
+    if len(deck) < session.round_count:
          return Response({'error': 'Klausimų kolekcijose nepakanka klausimų pagal nurodytą raundų skaičių.'}, status=400)
 
-    session.status = 'in_progress'
-    session.save()
-
     # Create first round
     round_number = 1
     start_time = timezone.now()
     end_time = start_time + timedelta(seconds=session.round_length)
-    
-    # Choose a random question from a random collection
-    question = None
-    if session.question_collections.exists():
-        live_cols = session.question_collections.filter(is_deleted=False)
-        if live_cols.exists():
-            collections = list(live_cols)
-        collection = random.choice(collections)
-        questions = list(collection.questions.all())
-        if questions:
-            question = random.choice(questions)
-
-    new_round = Round.objects.create(
-        game_session=session,
-        question=question,
-        round_number=round_number,
-        start_time=start_time,
-        end_time=end_time
-    )
+    question_id = deck.pop()
+
+    with transaction.atomic():
+        # Compare-and-set on status so a double click can't start the game twice
+        started = GameSession.objects.filter(id=session.id, status='pending').update(
+            status='in_progress',
+            current_round=round_number,
+            next_deadline=end_time,
+            question_deck=deck
+        )
+        if not started:
+            return Response({'error': 'Žaidimas jau prasidėjo arba baigėsi.'}, status=400)
+        session.refresh_from_db()
 
-    if question:
-        send_system_message(
-            new_round,
-            f"<p><strong>{new_round.round_number} raundas</strong></p><p>{new_round.question.text if new_round.question else 'Nėra klausimo.'}</p>"
+        new_round = Round.objects.create(
+            game_session=session,
+            question_id=question_id,
+            round_number=round_number,
+            start_time=start_time,
+            end_time=end_time,
+            expected_answers=expected_answer_count(session)
         )
+    schedule_round_end(new_round)
+
+    send_system_message(
+        new_round,
+        f"<p><strong>{new_round.round_number} raundas</strong></p><p>{new_round.question.text if new_round.question else 'Nėra klausimo.'}</p>"
+    )
 
     broadcast_round_update(session.code, new_round)
     broadcast_lobby_update(session)
@@ -683,9 +685,42 @@ def send_chat_message(request):
     )
 
     broadcast_chat_message(session.code, msg)
+    record_answer(session, participant, current_round)
 
     return Response({'message': 'Žinutė išsiųsta.'})
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def chat_history_view(request):
+    code = request.query_params.get('code', '').strip()
+    participant_id = request.query_params.get('participant_id', '').strip()
+    provided_secret = request.query_params.get('secret', '').strip()
+
+    if not code or not participant_id or not provided_secret:
+        return Response(
+            {'error': 'Prašome įvesti kambario kodą, dalyvio ID ir slaptažodį.'},
+            status=400
+        )
+
+    try:
+        session = GameSession.objects.get(code=code)
+    except GameSession.DoesNotExist:
+        return Response({'error': 'Kambarys nerastas.'}, status=404)
+
+    try:
+        participant = session.participants.get(id=participant_id)
+    except (Participant.DoesNotExist, ValueError):
+        return Response({'error': 'Dalyvis nerastas.'}, status=404)
+
+    if participant.secret != provided_secret:
+        return Response({'error': 'Netinkamas slaptažodis.'}, status=403)
+
+    return Response(chat_history(
+        session,
+        after_seq=_parse_seq(request.query_params.get('after')),
+        limit=_parse_seq(request.query_params.get('limit'), CHAT_HISTORY_PAGE),
+    ))
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def available_guess_options(request):
@@ -718,26 +753,8 @@ def available_guess_options(request):
     if participant.secret != provided_secret:
         return Response({'error': 'Netinkamas slaptažodis.'}, status=403)
 
-    assigned_chars = (
-        session.participants
-        .filter(assigned_character__isnull=False)
-        .exclude(id=participant.id)
-        .values('assigned_character__id', 'assigned_character__name', 'assigned_character__image')
-        .distinct()
-    )
-    
-    options = []
-    for char in assigned_chars:
-        image_url = char['assigned_character__image']
-        if image_url and not image_url.startswith('/'):
-            image_url = '/media/' + image_url
-        options.append({
-            'character_id': char['assigned_character__id'],
-            'character_name': char['assigned_character__name'],
-            'character_image': image_url if image_url else None
-        })
-    
-    return Response(options)
+    # Same list the socket pushes when guessing starts
+    return Response(guess_options_by_participant(session).get(participant.id, []))
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -837,6 +854,8 @@ def submit_guesses(request):
             )
         updated_guesses.append(guess.id)
 
+    record_guesser(session, participant)
+
     return Response({
         'message': 'Spėjimai sėkmingai pateikti.',
         'guesses_updated': updated_guesses
@@ -892,7 +911,7 @@ def add_npc(request):
         is_active=True
     )
 
-    broadcast_lobby_update(session)
+    broadcast_player_patch(session, npc, 'player_added')
     return Response({
         'npc_id': npc.id,
         'character': {
@@ -932,12 +951,21 @@ def kick_player(request):
         return Response({'error': 'Negalite išmesti savęs.'}, status=400)
 
 
+    target_id = target.id
     if session.status == 'pending':
         target.delete()
     else:
-        target.is_active = False
-        target.save()
+        # An away target was already removed from the guessers by mark_away
+        if deactivate(target):
+            remove_guesser(session, target)
 
-    broadcast_lobby_update(session)
+    broadcast_player_left(session, target_id, target)
 
     return Response({'message': 'Dalyvis pašalintas.'})
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def scheduler_metrics(request):
+    if not request.user.is_staff and client_ip(request) not in settings.METRICS_ALLOWED_IPS:
+        return Response({'error': 'Prieiga draudžiama.'}, status=403)
+    return HttpResponse(metrics.render_text(), content_type='text/plain; version=0.0.4')
@@ -0,0 +1,137 @@
+# game/clock.py
+
+import asyncio, heapq
+from datetime import datetime
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.db import close_old_connections
+from django.utils import timezone
+from .models import GameSession
+from .utils import (
+    GAME_CLOCK_GROUP, capture_broadcasts, encode_event, advance_session_round,
+    end_session_game
+)
+
+def _run_transition(session_id, status, round_number):
+    # Runs in a worker thread; the broadcasts it makes are handed back to the
+    # event loop instead of going through async_to_sync
+    close_old_connections()
+    try:
+        with capture_broadcasts() as sent:
+            if status == 'in_progress':
+                advance_session_round(session_id, round_number)
+            elif status == 'guessing':
+                end_session_game(session_id)
+        return sent
+    finally:
+        close_old_connections()
+
+def _load_deadlines():
+    close_old_connections()
+    return list(
+        GameSession.objects
+        .filter(status__in=['in_progress', 'guessing'], next_deadline__isnull=False)
+        .values_list('id', 'status', 'current_round', 'next_deadline')
+    )
+
+class GameClock:
+    """
+    Long-lived asyncio scheduler for session deadlines, used instead of
+    Celery ETA tasks when settings.GAME_CLOCK is 'daemon'.
+
+    Keeps a heap of (deadline, session) entries and sleeps until the earliest
+    one is due. New deadlines arrive on the GAME_CLOCK_GROUP channel group;
+    the full set is reloaded from the database on start and every
+    ``resync_interval`` seconds, so nothing is lost across restarts.
+    Transitions are idempotent, so stale or duplicate entries are harmless.
+    """
+
+    def __init__(self, resync_interval=30):
+        self.resync_interval = resync_interval
+        self.heap = []
+        # session id -> (deadline, status, round_number) it is due for next;
+        # heap entries that no longer match are skipped when popped
+        self.pending = {}
+        self.changed = asyncio.Event()
+        self.channel_layer = get_channel_layer()
+        self.channel_name = None
+
+    def push(self, session_id, status, round_number, deadline):
+        entry = (deadline, status, round_number)
+        if self.pending.get(session_id) == entry:
+            return
+        self.pending[session_id] = entry
+        heapq.heappush(self.heap, (deadline, session_id, status, round_number))
+        if self.heap[0][1] == session_id:
+            # New earliest deadline, wake the timer up
+            self.changed.set()
+
+    def pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, session_id, status, round_number = heapq.heappop(self.heap)
+            if self.pending.get(session_id) != (deadline, status, round_number):
+                continue
+            del self.pending[session_id]
+            due.append((session_id, status, round_number))
+        return due
+
+    async def resync(self):
+        for session_id, status, round_number, deadline in await sync_to_async(_load_deadlines)():
+            self.push(session_id, status, round_number, deadline)
+
+    async def run_due(self):
+        due = self.pop_due(timezone.now())
+        for session_id, status, round_number in due:
+            try:
+                sent = await sync_to_async(_run_transition)(session_id, status, round_number)
+            except Exception as e:
+                print(f"⚠️ Game clock could not advance session {session_id}: {e}")
+                continue
+            for group_name, event in sent:
+                if group_name == GAME_CLOCK_GROUP:
+                    # Our own follow-up deadline, no need for a round trip
+                    self.handle_deadline(event)
+                else:
+                    await self.channel_layer.group_send(group_name, encode_event(event))
+        return len(due)
+
+    def handle_deadline(self, message):
+        self.push(
+            message['session_id'],
+            message['status'],
+            message['round_number'],
+            datetime.fromisoformat(message['deadline']),
+        )
+
+    async def timer_loop(self):
+        while True:
+            timeout = None
+            if self.heap:
+                timeout = max(0, (self.heap[0][0] - timezone.now()).total_seconds())
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            await self.run_due()
+
+    async def receive_loop(self):
+        while True:
+            message = await self.channel_layer.receive(self.channel_name)
+            if message.get('type') == 'clock.deadline':
+                self.handle_deadline(message)
+
+    async def resync_loop(self):
+        while True:
+            await asyncio.sleep(self.resync_interval)
+            # Group membership expires in the channel layer, renew it too
+            await self.channel_layer.group_add(GAME_CLOCK_GROUP, self.channel_name)
+            await self.resync()
+
+    async def run(self):
+        self.channel_name = await self.channel_layer.new_channel()
+        await self.channel_layer.group_add(GAME_CLOCK_GROUP, self.channel_name)
+        await self.resync()
+        print(f"⏰ Game clock started with {len(self.pending)} pending deadlines")
+        await asyncio.gather(self.timer_loop(), self.receive_loop(), self.resync_loop())
@@ -1,85 +1,361 @@
 # backend/game/consumers.py
 
-import json
+import asyncio, json, time
+from collections import deque
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .models import GameSession, Participant
+from .models import GameSession, Participant, Round, Message
+from .utils import (
+    lobby_snapshot, broadcast_chat_message, record_answer, mark_back,
+    participant_group, guess_options_by_participant, chat_history
+)
+from .presence import heartbeats, get_presence
+from . import metrics, protocol
+from django.conf import settings
 from asgiref.sync import sync_to_async
 from django.utils import timezone
 
+# A newer snapshot makes these queued frames pointless to send
+SUPERSEDED_BY_SNAPSHOT = ('lobby_snapshot', 'lobby_patch')
+
+class SendQueue:
+    """
+    Frames waiting to be written to one socket. Queuing a lobby snapshot
+    drops the snapshots and patches queued before it.
+
+    Under Daphne send() only hands the frame to the transport and never
+    blocks, so a slow client's frames pile up in the transport buffer, not
+    here. Once the client acknowledges frames (ack()), the frames written
+    but not acknowledged count towards its backlog too. The queue is over
+    budget once the backlog has reached twice ``limit``, or has stayed over
+    ``limit`` for ``grace`` seconds.
+    """
+    def __init__(self, limit, grace):
+        self.limit = limit
+        self.grace = grace
+        self.frames = deque()
+        self.over_since = None
+        self.ready = asyncio.Event()
+        # Frames handed to the writer, and how many of them the client has
+        # acknowledged; None for clients that don't send acks
+        self.written = 0
+        self.acked = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def backlog(self):
+        unacked = 0 if self.acked is None else self.written - self.acked
+        return len(self.frames) + unacked
+
+    def check_backlog(self, now=None):
+        if self.backlog() <= self.limit:
+            self.over_since = None
+        elif self.over_since is None:
+            self.over_since = time.monotonic() if now is None else now
+
+    def ack(self, frames, now=None):
+        """The client has received its first ``frames`` frames."""
+        self.acked = max(self.acked or 0, min(frames, self.written))
+        self.check_backlog(now)
+
+    def put(self, frame, kind=None, now=None):
+        """Queue ``frame`` (kwargs for send()); returns how many frames it replaced."""
+        coalesced = 0
+        if kind == 'lobby_snapshot':
+            kept = deque(f for f in self.frames if f[0] not in SUPERSEDED_BY_SNAPSHOT)
+            coalesced = len(self.frames) - len(kept)
+            self.frames = kept
+        self.frames.append((kind, frame))
+        self.ready.set()
+        self.check_backlog(now)
+        return coalesced
+
+    def over_budget(self, now=None):
+        if self.backlog() >= 2 * self.limit:
+            return True
+        if self.over_since is None:
+            return False
+        now = time.monotonic() if now is None else now
+        return now - self.over_since >= self.grace
+
+    def clear(self):
+        dropped = len(self.frames)
+        self.frames.clear()
+        self.over_since = None
+        return dropped
+
+    async def get(self):
+        while not self.frames:
+            self.ready.clear()
+            await self.ready.wait()
+        _, frame = self.frames.popleft()
+        self.written += 1
+        self.check_backlog()
+        return frame
+
 class LobbyConsumer(AsyncWebsocketConsumer):
+    # Set by ?participant_id=&secret= at connect (required) or a later
+    # 'auth' message; needed to chat, to count as present and to get
+    # private messages
+    participant = None
+    # Binary MessagePack frames (protocol.COMPACT_SUBPROTOCOL) instead of JSON
+    compact = False
+    # Outgoing frames and the task writing them, set up once accepted;
+    # without them (tests driving the consumer directly) frames go out inline
+    outbound = None
+    writer = None
+    evicted = False
+    # Close code for sockets evicted as too slow; the client reconnects
+    SLOW_CLOSE_CODE = 4008
+
     async def connect(self):
         self.room_code = self.scope['url_route']['kwargs']['room_code']
         self.group_name = f'lobby_{self.room_code}'
+        self.compact = (
+            settings.SOCKET_COMPACT_PROTOCOL
+            and protocol.COMPACT_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        )
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        participant = await self.load_participant(
+            query.get('participant_id', [''])[0], query.get('secret', [''])[0]
+        )
+        if participant is None:
+            # Missing or wrong credentials: the lobby page always sends them
+            await self.close(code=4003)
+            return
+
         await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        await self.accept(subprotocol=protocol.COMPACT_SUBPROTOCOL if self.compact else None)
+        self.outbound = SendQueue(settings.SOCKET_SEND_QUEUE_LIMIT, settings.SOCKET_SLOW_GRACE_SECONDS)
+        self.writer = asyncio.ensure_future(self.write_frames())
         await self.send_initial_state()
+        await self.attach(participant)
 
     async def send_initial_state(self):
+        if not await self.send_snapshot():
+            await self.close()
+
+    async def send_snapshot(self, known_version=None):
+        """
+        Send the full lobby, unless the client already has ``known_version``.
+        Returns False if the room does not exist.
+        """
         try:
             session = await sync_to_async(GameSession.objects.get)(code=self.room_code)
         except GameSession.DoesNotExist:
-            await self.close()
-            return
+            return False
+        if known_version == session.state_version:
+            return True
+        data = await sync_to_async(lobby_snapshot)(session)
+        await self.send_data(data)
+        return True
+
+    async def disconnect(self, close_code):
+        if self.writer is not None:
+            self.writer.cancel()
+            self.writer = None
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if self.participant is not None:
+            await self.detach()
 
-        participants = await sync_to_async(list)(
-            session.participants
-                   .all()
-                   .order_by('joined_at')
-                   .select_related('assigned_character', 'user')
+    async def presence(self, method, participant_id):
+        # Redis calls don't touch the ORM, keep them off the main sync thread
+        store = get_presence()
+        await sync_to_async(getattr(store, method), thread_sensitive=False)(
+            self.room_code, participant_id
         )
 
-        players = []
-        host_id = None
-        for part in participants:
-            username = (
-                part.user.username
-                if part.user
-                else (part.guest_name or f"Guest {part.guest_identifier[:8]}")
-            )
+    async def send_data(self, data):
+        if self.compact:
+            await self.deliver({'bytes_data': protocol.pack(data)}, data.get('type'))
+        else:
+            await self.deliver({'text_data': json.dumps(data)}, data.get('type'))
 
-            if part.is_host:
-                host_id = part.id
+    async def deliver(self, frame, kind=None):
+        """
+        Queue ``frame`` for the writer. A client that can't keep up only gets
+        the newest snapshot, and is closed if its queue stays over budget
+        instead of growing this process and the layer's channel queue.
+        """
+        if self.evicted:
+            return
+        if self.outbound is None:
+            await self.send(**frame)
+            return
+        coalesced = self.outbound.put(frame, kind)
+        if coalesced:
+            await self.count('socket_frames_coalesced_total', coalesced)
+        if self.outbound.over_budget():
+            await self.evict()
 
-            players.append({
-                'id': part.id,
-                'username': username,
-                'characterSelected': part.assigned_character is not None,
-                'is_host': part.is_host,
-                'is_npc': part.is_npc,
-            })
+    async def write_frames(self):
+        while True:
+            frame = await self.outbound.get()
+            await self.send(**frame)
 
-        collections = await sync_to_async(list)(
-            session.question_collections.values('id', 'name')
-        )
+    async def evict(self):
+        self.evicted = True
+        if self.writer is not None:
+            self.writer.cancel()
+            self.writer = None
+        dropped = self.outbound.clear()
+        print(f"🐢 Closing slow socket in {self.room_code}, {dropped} frames dropped")
+        await self.count('socket_frames_dropped_total', dropped)
+        await self.count('socket_evictions_total')
+        await self.close(code=self.SLOW_CLOSE_CODE)
 
-        data = {
-            'code': session.code,
-            'players': players,
-            'host_id': host_id,
-            'status': session.status,
-            'round_length': session.round_length,
-            'round_count': session.round_count,
-            'guess_timer': session.guess_timer,
-            'guess_deadline': session.guess_deadline.isoformat() if session.guess_deadline else None,
-            'question_collections': collections,
-        }
-        await self.send(text_data=json.dumps(data))
+    def acknowledge(self, frames):
+        if self.outbound is not None and isinstance(frames, int) and frames >= 0:
+            self.outbound.ack(frames)
 
-    async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+    async def count(self, name, delta=1):
+        await sync_to_async(metrics.incr, thread_sensitive=False)(name, delta)
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        data = protocol.unpack(bytes_data) if bytes_data is not None else json.loads(text_data)
+        if 'frames' in data:
+            # Pings and acks carry how many frames the client has received
+            self.acknowledge(data['frames'])
+        if data.get('type') == 'ack':
+            return
         if data.get('type') == 'ping':
-            participant_id = data.get('participant_id')
-            if participant_id:
-                try:
-                    participant = await sync_to_async(Participant.objects.get)(id=participant_id)
-                    participant.last_seen = timezone.now()
-                    await sync_to_async(participant.save)()
-                except Participant.DoesNotExist:
-                    pass
+            # Only for the participant the socket authenticated as; buffered,
+            # written to last_seen in bulk by the presence flusher
+            if self.participant is not None:
+                await self.presence('touch', self.participant.id)
+                heartbeats.record(self.participant.id, timezone.now())
+            return
+        if data.get('type') == 'sync':
+            # The client saw a gap in the patch versions
+            await self.send_snapshot(data.get('version'))
+            return
+        if data.get('type') == 'resume':
+            await self.resume(data.get('after_seq'))
+            return
+        if data.get('type') == 'auth':
+            await self.authenticate(data)
+            return
+        if data.get('type') == 'chat':
+            await self.chat(data)
+            return
+
+    async def resume(self, after_seq):
+        """Chat the client missed: one page after ``after_seq``, it asks again while has_more."""
+        try:
+            after_seq = max(0, int(after_seq))
+        except (TypeError, ValueError):
+            after_seq = 0
+        try:
+            session = await GameSession.objects.aget(code=self.room_code)
+        except GameSession.DoesNotExist:
+            return
+        history = await sync_to_async(chat_history)(session, after_seq)
+        await self.send_data({'type': 'chat_history', **history})
+
+    async def send_error(self, error):
+        await self.send_data({'type': 'error', 'error': error})
+
+    async def load_participant(self, participant_id, secret):
+        try:
+            participant = await Participant.objects.select_related(
+                'assigned_character', 'game_session'
+            ).aget(id=participant_id, game_session__code=self.room_code)
+        except (Participant.DoesNotExist, ValueError, TypeError):
+            return None
+        if not secret or participant.secret != secret:
+            return None
+        return participant
+
+    async def authenticate(self, data):
+        participant = await self.load_participant(data.get('participant_id'), data.get('secret'))
+        if participant is None:
+            await self.send_error('Netinkamas dalyvio ID arba slaptažodis.')
             return
+        await self.attach(participant)
+
+    async def attach(self, participant):
+        """Bind the socket to ``participant``: presence, private group, catch-up."""
+        if self.participant is not None:
+            if self.participant.id == participant.id:
+                await self.send_data({'type': 'auth_ok'})
+                return
+            await self.detach()
+        self.participant = participant
+        await self.channel_layer.group_add(participant_group(participant.id), self.channel_name)
+        await self.presence('connect', participant.id)
+        if participant.away:
+            await sync_to_async(mark_back)(participant)
+        await self.send_data({'type': 'auth_ok'})
+
+        if participant.game_session.status == 'guessing' and not participant.is_npc:
+            # Reconnected mid-guessing: the push went out while we were gone
+            options = await sync_to_async(guess_options_by_participant)(participant.game_session)
+            await self.send_data({
+                'type': 'guess_options', 'options': options.get(participant.id, [])
+            })
+
+    async def detach(self):
+        await self.channel_layer.group_discard(
+            participant_group(self.participant.id), self.channel_name
+        )
+        await self.presence('disconnect', self.participant.id)
+        self.participant = None
+
+    async def chat(self, data):
+        # Same checks as the send_chat_message view, minus the per-message
+        # room and participant lookups done once by authenticate()
+        if self.participant is None:
+            await self.send_error('Netinkamas slaptažodis.')
+            return
+        text = str(data.get('text', '')).strip()
+        if not text:
+            await self.send_error('Trūksta reikiamų laukų.')
+            return
+
+        current_round = await (
+            Round.objects
+            .select_related('game_session')
+            .filter(
+                game_session_id=self.participant.game_session_id,
+                game_session__status='in_progress',
+                end_time__gt=timezone.now()
+            )
+            .order_by('-round_number')
+            .afirst()
+        )
+        if current_round is None:
+            await self.send_error('Palaukite sekančio raundo.')
+            return
+
+        if self.participant.assigned_character_id is None:
+            # The character is usually picked after the socket authenticated;
+            # reloaded until the copy loaded then has one
+            self.participant = await Participant.objects.select_related(
+                'assigned_character', 'game_session'
+            ).aget(id=self.participant.id)
+        message = await Message.objects.acreate(
+            participant=self.participant, round=current_round, text=text
+        )
+        # Through the outbox like HTTP chat and the round's system message,
+        # so clients get the room's chat in seq order
+        await sync_to_async(broadcast_chat_message)(self.room_code, message)
+        await sync_to_async(record_answer)(
+            current_round.game_session, self.participant, current_round
+        )
 
     async def lobby_update(self, event):
-        await self.send(text_data=json.dumps(event['data']))
+        # Broadcasts arrive already encoded (utils.encode_event); 'data' is
+        # what senders from before that change put on the layer
+        kind = event.get('kind') or event.get('data', {}).get('type')
+        if self.compact:
+            packed = event.get('bytes')
+            if packed is None:
+                packed = protocol.pack(event['data'] if 'data' in event else json.loads(event['text']))
+            await self.deliver({'bytes_data': packed}, kind)
+            return
+        text = event.get('text')
+        if text is None:
+            text = json.dumps(event['data'])
+        await self.deliver({'text_data': text}, kind)
@@ -0,0 +1,99 @@
+import asyncio, json, time
+import msgpack
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from game.consumers import LobbyConsumer
+from game.models import GameSession, Participant, Character, Question, Round, Message, Guess
+from game.utils import build_lobby_snapshot, encode_event
+
+def room_payload(size):
+    """
+    The results snapshot of a completed game with ``size`` players, the
+    largest lobby frame, built by build_lobby_snapshot from rows that are
+    rolled back afterwards.
+    """
+    with transaction.atomic():
+        session = GameSession.objects.create(code=f'_BENCH{size}', status='completed')
+        rnd = Round.objects.create(
+            game_session=session, question=Question.objects.create(text='Bench question'),
+            round_number=1, end_time=timezone.now()
+        )
+        players = []
+        for i in range(size):
+            character = Character.objects.create(
+                name=f'Character {i}', image=f'character_images/{i:032x}.png'
+            )
+            players.append(Participant.objects.create(
+                guest_identifier=f'bench{i}', guest_name=f'Player {i}', game_session=session,
+                is_host=(i == 0), assigned_character=character, points=150,
+            ))
+            Message.objects.create(participant=players[-1], round=rnd, text='labas')
+        Guess.objects.bulk_create([
+            Guess(
+                guesser=guesser, guessed_participant=target,
+                guessed_character=target.assigned_character,
+                is_correct=(guesser.id + target.id) % 2 == 0,
+            )
+            for guesser in players for target in players if guesser != target
+        ])
+        data = build_lobby_snapshot(session)
+        transaction.set_rollback(True)
+    return data
+
+def sockets(size):
+    """Lobby consumers whose writes go nowhere."""
+    async def discard(text_data=None, bytes_data=None):
+        pass
+
+    consumers = []
+    for _ in range(size):
+        consumer = LobbyConsumer()
+        consumer.send = discard
+        consumers.append(consumer)
+    return consumers
+
+class Command(BaseCommand):
+    help = (
+        "Compare the CPU cost of one lobby broadcast when every consumer "
+        "encodes the payload (old: the event carries 'data') with encoding it "
+        "once at the sender (new: utils.encode_event). Each run serializes the "
+        "event for the layer once (msgpack, as channels_redis does) and, per "
+        "socket, deserializes it and runs LobbyConsumer.lobby_update."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[2, 5, 10, 25, 50, 100])
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        self.stdout.write(f"{'sockets':>7} {'bytes':>7} {'old us':>9} {'new us':>9} {'speedup':>8}")
+        for size in options['sizes']:
+            data = room_payload(size)
+            consumers = sockets(size)
+
+            def old():
+                return {'type': 'lobby_update', 'data': data}
+
+            def new():
+                return encode_event({'type': 'lobby_update', 'data': data})
+
+            old_us = asyncio.run(self.measure(old, consumers, repeat))
+            new_us = asyncio.run(self.measure(new, consumers, repeat))
+            self.stdout.write(
+                f"{size:>7} {len(json.dumps(data)):>7} {old_us:>9.1f} {new_us:>9.1f} "
+                f"{old_us / new_us:>7.1f}x"
+            )
+
+    async def measure(self, make_event, consumers, repeat):
+        async def broadcast():
+            wire = msgpack.packb(make_event(), use_bin_type=True)
+            for consumer in consumers:
+                await consumer.lobby_update(msgpack.unpackb(wire, raw=False))
+
+        await broadcast()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            await broadcast()
+        return (time.perf_counter() - started) / repeat * 1e6
@@ -0,0 +1,116 @@
+import asyncio, time
+from redis.exceptions import RedisError
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from backend.channel_layers import BACKENDS, channel_layer_config
+from game.utils import encode_event
+from game.management.commands.bench_socket_protocol import FRAMES
+
+# Key prefix of the benchmark's layers: flush() at the end of a run deletes
+# every key under it, which with the default 'asgi' would be every live lobby
+KEY_PREFIX = 'bench'
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class Command(BaseCommand):
+    help = (
+        "group_send throughput and delivery latency to lobby groups of several "
+        "sizes, for each channel layer backend (CHANNEL_LAYER_BACKEND)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+        parser.add_argument('--hosts', nargs='+', default=settings.CHANNEL_REDIS_HOSTS,
+                            help="Redis URLs; several shard the Redis layers across them")
+        parser.add_argument('--sizes', nargs='+', type=int, default=[2, 8, 32, 128],
+                            help="Sockets in the lobby group")
+        parser.add_argument('--messages', type=int, default=200,
+                            help="Broadcasts sent to each group")
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--allow-live-hosts', action='store_true',
+                            help="Run against CHANNEL_REDIS_HOSTS, which live lobbies use")
+
+    def handle(self, *args, **options):
+        live = set(options['hosts']) & set(settings.CHANNEL_REDIS_HOSTS)
+        if live and set(options['backends']) - {'memory'} and not options['allow_live_hosts']:
+            raise CommandError(
+                f"{', '.join(sorted(live))} serves live lobbies; pass --hosts with a "
+                "separate Redis, or --allow-live-hosts"
+            )
+        # What a chat broadcast puts on the layer
+        event = encode_event({'type': 'lobby_update', 'data': FRAMES['chat']})
+        self.stdout.write(
+            f"{'backend':<22} {'sockets':>7} {'sends/s':>9} {'deliveries/s':>12} "
+            f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'lost':>5}"
+        )
+        for backend in options['backends']:
+            label = backend
+            if backend != 'memory' and len(options['hosts']) > 1:
+                label = f"{backend} x{len(options['hosts'])}"
+            for size in options['sizes']:
+                try:
+                    result = asyncio.run(self.run(
+                        backend, options['hosts'], size, options['messages'], event, options['timeout']
+                    ))
+                except (OSError, RedisError) as exc:
+                    self.stdout.write(f"{label:<22} skipped: {exc}")
+                    break
+                self.stdout.write(
+                    f"{label:<22} {size:>7} {result['sends']:>9.0f} {result['deliveries']:>12.0f} "
+                    f"{result['p50']:>7.2f} {result['p95']:>7.2f} {result['p99']:>7.2f} {result['lost']:>5}"
+                )
+
+    async def run(self, backend, hosts, size, messages, event, timeout):
+        config = channel_layer_config(backend, hosts)
+        if 'CONFIG' in config:
+            config['CONFIG']['prefix'] = KEY_PREFIX
+        layer = import_string(config['BACKEND'])(**config.get('CONFIG', {}))
+        group = f'lobby_BENCH{size}'
+        channels = [await layer.new_channel() for _ in range(size)]
+        for channel in channels:
+            await layer.group_add(group, channel)
+
+        expected = size * messages
+        latencies = []
+        done = asyncio.Event()
+
+        async def receive(channel):
+            while True:
+                message = await layer.receive(channel)
+                latencies.append(time.perf_counter() - message['sent_at'])
+                if len(latencies) == expected:
+                    done.set()
+
+        receivers = [asyncio.create_task(receive(channel)) for channel in channels]
+        try:
+            started = time.perf_counter()
+            for _ in range(messages):
+                await layer.group_send(group, {**event, 'sent_at': time.perf_counter()})
+            sent = time.perf_counter()
+            try:
+                await asyncio.wait_for(done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            finished = time.perf_counter()
+        finally:
+            for task in receivers:
+                task.cancel()
+            await asyncio.gather(*receivers, return_exceptions=True)
+            for channel in channels:
+                await layer.group_discard(group, channel)
+            if hasattr(layer, 'flush'):
+                await layer.flush()
+
+        delivered = len(latencies)
+        latencies = latencies or [float('nan')]
+        return {
+            'sends': messages / (sent - started),
+            'deliveries': delivered / (finished - started),
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'lost': expected - delivered,
+        }
@@ -0,0 +1,59 @@
+import time
+import redis
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from backend.channel_layers import channel_layer_config
+from game.publisher import Publisher
+from game.utils import encode_event
+from game.management.commands.bench_socket_protocol import FRAMES
+
+class Command(BaseCommand):
+    help = (
+        "Redis connections opened by broadcasts from sync code: async_to_sync "
+        "per send (the old path) vs the long-lived publisher loop (game.publisher). "
+        "Counts total_connections_received on the channel layer's Redis, so "
+        "run it while nothing else connects there."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', default='redis', choices=['redis', 'redis_pubsub'])
+        parser.add_argument('--hosts', nargs='+', default=settings.CHANNEL_REDIS_HOSTS)
+        parser.add_argument('--messages', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=0.01,
+                            help="Seconds between broadcasts, like views and tasks spread over time")
+
+    def handle(self, *args, **options):
+        config = channel_layer_config(options['backend'], options['hosts'])
+        layer = import_string(config['BACKEND'])(**config['CONFIG'])
+        clients = [redis.Redis.from_url(url) for url in options['hosts']]
+        event = encode_event({'type': 'lobby_update', 'data': FRAMES['chat']})
+        publisher = Publisher()
+
+        def old_path():
+            async_to_sync(layer.group_send)('lobby_BENCHPUB', event)
+
+        def new_path():
+            publisher.publish_many(layer, [('lobby_BENCHPUB', event)])
+
+        self.stdout.write(f"{'path':<14} {'sends':>6} {'seconds':>8} {'conns':>6} {'conns/min':>10}")
+        for name, send in (('async_to_sync', old_path), ('publisher', new_path)):
+            try:
+                before = self.connections(clients)
+            except redis.RedisError as exc:
+                raise CommandError(f"Channel layer Redis unreachable: {exc}")
+            started = time.perf_counter()
+            for _ in range(options['messages']):
+                send()
+                time.sleep(options['interval'])
+            publisher.flush(30)
+            elapsed = time.perf_counter() - started
+            opened = self.connections(clients) - before
+            self.stdout.write(
+                f"{name:<14} {options['messages']:>6} {elapsed:>8.2f} {opened:>6} {opened / elapsed * 60:>10.0f}"
+            )
+
+    def connections(self, clients):
+        # Our own INFO call opens nothing new: each client keeps its connection
+        return sum(client.info('stats')['total_connections_received'] for client in clients)
@@ -0,0 +1,100 @@
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from game import tasks, utils
+from game.models import GameSession, QuestionCollection, Question, Round
+from game.utils import advance_sessions, capture_broadcasts, session_shard
+
+# Room codes are upper case letters only, so no real room starts with this
+CODE_PREFIX = '_BENCH'
+
+class Command(BaseCommand):
+    help = (
+        "Measure round transition latency (round start minus deadline) as the "
+        "number of live rooms grows. Creates its own sessions (codes starting "
+        f"with {CODE_PREFIX}), makes them all due at once and advances them shard "
+        "by shard on --workers threads. Round-end and NPC tasks are not queued "
+        "and broadcasts are not sent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, nargs='+', default=[10, 100, 500, 1000])
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Threads advancing shards in parallel (simulated workers)")
+
+    def handle(self, *args, **options):
+        collection = QuestionCollection.objects.create(name=f'{CODE_PREFIX} questions')
+        questions = [
+            Question.objects.create(text=f'{CODE_PREFIX} question {i}') for i in range(3)
+        ]
+        collection.questions.set(questions)
+        self.deck = [q.id for q in questions]
+        self.stdout.write(f"{'rooms':>6} {'workers':>7} {'wall ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        try:
+            # The rooms are only measured: nothing may act on them afterwards
+            with mock.patch.object(utils, 'schedule_round_end'), \
+                    mock.patch.object(utils, 'schedule_game_end'), \
+                    mock.patch.object(tasks.schedule_npc_responses, 'delay'):
+                for rooms in options['rooms']:
+                    self.run_size(rooms, options['workers'], collection)
+        finally:
+            GameSession.objects.filter(code__startswith=CODE_PREFIX).delete()
+            Question.all_objects.filter(collections=collection).delete()
+            QuestionCollection.all_objects.filter(id=collection.id).delete()
+
+    def run_size(self, rooms, workers, collection):
+        GameSession.objects.filter(code__startswith=CODE_PREFIX).delete()
+        deadline = timezone.now()
+        sessions = GameSession.objects.bulk_create([
+            GameSession(
+                code=f'{CODE_PREFIX}{i}', status='in_progress',
+                round_count=3, next_deadline=deadline,
+                question_deck=list(self.deck)
+            )
+            for i in range(rooms)
+        ])
+        GameSession.question_collections.through.objects.bulk_create([
+            GameSession.question_collections.through(
+                gamesession_id=session.id, questioncollection_id=collection.id
+            )
+            for session in sessions
+        ])
+
+        shards = defaultdict(list)
+        for session in sessions:
+            shards[session_shard(session.code)].append(session.id)
+
+        def run_shard(session_ids):
+            try:
+                # Per thread: the capture lives in a context variable
+                with capture_broadcasts():
+                    advance_sessions(session_ids)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run_shard, shards.values()))
+        wall = (time.perf_counter() - started) * 1000
+
+        latencies = sorted(
+            (start - deadline).total_seconds() * 1000
+            for start in Round.objects.filter(
+                game_session__code__startswith=CODE_PREFIX
+            ).values_list('start_time', flat=True)
+        )
+        if not latencies:
+            self.stdout.write(self.style.ERROR(f"{rooms:>6} no rounds were created"))
+            return
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        self.stdout.write(
+            f"{rooms:>6} {workers:>7} {wall:>9.1f} {pct(0.50):>8.1f} "
+            f"{pct(0.95):>8.1f} {pct(0.99):>8.1f} {latencies[-1]:>8.1f}"
+        )
@@ -0,0 +1,62 @@
+import json, time
+from django.core.management.base import BaseCommand
+from game import protocol
+from game.management.commands.bench_broadcast_encoding import room_payload
+
+def pending_snapshot(size):
+    data = room_payload(size)
+    data['status'] = 'pending'
+    for player in data['players']:
+        for key in ('points', 'correctGuesses', 'guesses', 'score_breakdown'):
+            del player[key]
+        player['assigned_character'] = None
+    return data
+
+FRAMES = {
+    'snapshot (pending, 8)': pending_snapshot(8),
+    'snapshot (completed, 8)': room_payload(8),
+    'patch (character)': {
+        'type': 'lobby_patch', 'version': 17, 'op': 'player_updated',
+        'player': {'id': 812, 'username': 'Ona', 'characterSelected': True,
+                   'is_host': False, 'is_npc': False, 'is_active': True},
+    },
+    'chat': {
+        'type': 'chat_update',
+        'message': {'id': 99120, 'text': 'Manau, kad tai robotas.', 'sentAt': '2025-05-01T18:22:31.512345+00:00',
+                    'characterName': 'Pelėda', 'characterImage': '/media/character_images/3f2a9c0d.png'},
+    },
+    'round': {
+        'type': 'round_update',
+        'round': {'round_number': 2, 'question': 'Koks tavo mėgstamiausias patiekalas?',
+                  'end_time': '2025-05-01T18:23:31.512345+00:00'},
+    },
+}
+
+class Command(BaseCommand):
+    help = (
+        "Bytes per frame and encode time of typical lobby frames in the JSON "
+        "protocol and in the compact MessagePack subprotocol (game.protocol)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        self.stdout.write(
+            f"{'frame':<24} {'json B':>7} {'compact B':>9} {'ratio':>6} {'json us':>8} {'compact us':>10}"
+        )
+        for name, data in FRAMES.items():
+            json_bytes = len(json.dumps(data).encode())
+            compact_bytes = len(protocol.pack(data))
+            self.stdout.write(
+                f"{name:<24} {json_bytes:>7} {compact_bytes:>9} {compact_bytes / json_bytes:>6.2f} "
+                f"{self.measure(json.dumps, data, repeat):>8.1f} "
+                f"{self.measure(protocol.pack, data, repeat):>10.1f}"
+            )
+
+    def measure(self, encode, data, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            encode(data)
+        return (time.perf_counter() - started) / repeat * 1e6
@@ -0,0 +1,15 @@
+import json
+from django.core.management.base import BaseCommand
+from game import metrics
+
+class Command(BaseCommand):
+    help = "Print the scheduler lag histograms (with p50/p95/p99 bucket bounds) and socket counters as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help="Clear the metrics after printing them")
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(metrics.snapshot(), indent=2))
+        if options['reset']:
+            metrics.reset()
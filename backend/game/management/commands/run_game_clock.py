@@ -0,0 +1,16 @@
+import asyncio
+from django.core.management.base import BaseCommand
+from game.clock import GameClock
+
+class Command(BaseCommand):
+    help = (
+        "Run the asyncio game clock: advances rounds and ends guessing phases "
+        "at their deadlines and sends the broadcasts itself. Use with GAME_CLOCK=daemon."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resync', type=float, default=30,
+                            help="Seconds between reloading all deadlines from the database")
+
+    def handle(self, *args, **options):
+        asyncio.run(GameClock(resync_interval=options['resync']).run())
@@ -0,0 +1,129 @@
+# game/metrics.py
+
+from django.core.cache import cache
+
+# Histogram bucket upper bounds
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+HISTOGRAMS = {
+    'round_transition_lag_seconds': (
+        "Round end_time to the next phase being committed", LAG_BUCKETS),
+    'round_broadcast_lag_seconds': (
+        "Round end_time to the transition broadcasts reaching the channel layer", LAG_BUCKETS),
+    'guess_transition_lag_seconds': (
+        "Guess deadline to the game being completed", LAG_BUCKETS),
+    'guess_broadcast_lag_seconds': (
+        "Guess deadline to the results broadcast reaching the channel layer", LAG_BUCKETS),
+    'tick_scan_duration_seconds': (
+        "Duration of one fallback sweep over due sessions", LAG_BUCKETS),
+    'tick_sessions_examined': (
+        "Sessions loaded by one fallback sweep", COUNT_BUCKETS),
+}
+
+COUNTERS = {
+    'socket_frames_coalesced_total':
+        "Queued lobby frames replaced by a newer snapshot before being sent",
+    'socket_frames_dropped_total':
+        "Queued frames discarded when a slow socket was evicted",
+    'socket_evictions_total':
+        "Sockets closed for staying over their send queue budget",
+}
+
+# Sums are kept as integers (cache incr), in millionths of the unit
+_SUM_SCALE = 1_000_000
+
+def _key(name, part):
+    return f'metrics:{name}:{part}'
+
+def _incr(key, delta=1):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # First observation; add() loses to a concurrent first writer
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+def observe(name, value):
+    """
+    Record ``value`` in histogram ``name``. Counters live in the Django cache
+    so that web, worker and game clock processes share them.
+    """
+    buckets = HISTOGRAMS[name][1]
+    bucket = next((str(b) for b in buckets if value <= b), '+Inf')
+    _incr(_key(name, bucket))
+    _incr(_key(name, 'count'))
+    _incr(_key(name, 'sum'), int(value * _SUM_SCALE))
+
+def incr(name, delta=1):
+    """Add ``delta`` to counter ``name``."""
+    assert name in COUNTERS, name
+    if delta:
+        _incr(_key(name, 'total'), delta)
+
+def observe_lag(name, deadline, at):
+    """Record how late ``at`` is relative to ``deadline``, if it is late at all."""
+    if deadline is not None and at >= deadline:
+        observe(name, (at - deadline).total_seconds())
+
+def snapshot():
+    """
+    All histograms as {name: {help, buckets (cumulative), count, sum, p50,
+    p95, p99}} and counters as {name: {help, value}}.
+    """
+    values = cache.get_many(_all_keys())
+
+    result = {}
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        cumulative, running = [], 0
+        for bound in [*map(str, buckets), '+Inf']:
+            running += values.get(_key(name, bound), 0)
+            cumulative.append((bound, running))
+        count = values.get(_key(name, 'count'), 0)
+
+        def quantile(q):
+            # Upper bound of the bucket holding the q-th observation
+            if not count:
+                return None
+            for bound, seen in cumulative:
+                if seen >= q * count:
+                    return bound
+            return '+Inf'
+
+        result[name] = {
+            'help': help_text,
+            'buckets': dict(cumulative),
+            'count': count,
+            'sum': values.get(_key(name, 'sum'), 0) / _SUM_SCALE,
+            'p50': quantile(0.50),
+            'p95': quantile(0.95),
+            'p99': quantile(0.99),
+        }
+    for name, help_text in COUNTERS.items():
+        result[name] = {'help': help_text, 'value': values.get(_key(name, 'total'), 0)}
+    return result
+
+def render_text():
+    """The histograms in the Prometheus text exposition format."""
+    lines = []
+    for name, data in snapshot().items():
+        lines.append(f'# HELP {name} {data["help"]}')
+        if name in COUNTERS:
+            lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name} {data["value"]}')
+            continue
+        lines.append(f'# TYPE {name} histogram')
+        for bound, seen in data['buckets'].items():
+            lines.append(f'{name}_bucket{{le="{bound}"}} {seen}')
+        lines.append(f'{name}_sum {data["sum"]}')
+        lines.append(f'{name}_count {data["count"]}')
+    return '\n'.join(lines) + '\n'
+
+def _all_keys():
+    keys = []
+    for name, (_, buckets) in HISTOGRAMS.items():
+        keys += [_key(name, b) for b in [*map(str, buckets), '+Inf', 'count', 'sum']]
+    return keys + [_key(name, 'total') for name in COUNTERS]
+
+def reset():
+    cache.delete_many(_all_keys())
@@ -0,0 +1,13 @@
+# game/middleware.py
+
+from .utils import batch_broadcasts
+
+class BroadcastBatchMiddleware:
+    """Send everything one request broadcasts as one frame per lobby."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with batch_broadcasts():
+            return self.get_response(request)
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:15
+
+from django.db import migrations, models
+
+
+def backfill_next_deadline(apps, schema_editor):
+    GameSession = apps.get_model('game', 'GameSession')
+    Round = apps.get_model('game', 'Round')
+    for session in GameSession.objects.filter(status='in_progress'):
+        latest = Round.objects.filter(game_session=session).order_by('-round_number').first()
+        session.next_deadline = latest.end_time if latest else session.updated_at
+        session.save(update_fields=['next_deadline'])
+    GameSession.objects.filter(status='guessing').update(
+        next_deadline=models.F('guess_deadline')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0023_character_ai_context'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='next_deadline',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['status', 'next_deadline'], name='session_deadline_idx'),
+        ),
+        migrations.RunPython(backfill_next_deadline, migrations.RunPython.noop),
+    ]
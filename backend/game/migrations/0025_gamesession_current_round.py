@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:16
+
+from django.db import migrations, models
+
+
+def backfill_current_round(apps, schema_editor):
+    GameSession = apps.get_model('game', 'GameSession')
+    sessions = GameSession.objects.annotate(
+        latest_round=models.Max('rounds__round_number')
+    ).filter(latest_round__isnull=False)
+    for session in sessions:
+        session.current_round = session.latest_round
+        session.save(update_fields=['current_round'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0024_gamesession_next_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='current_round',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_current_round, migrations.RunPython.noop),
+    ]
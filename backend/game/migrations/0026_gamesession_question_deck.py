@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:18
+
+import random
+from django.db import migrations, models
+
+
+def backfill_question_deck(apps, schema_editor):
+    GameSession = apps.get_model('game', 'GameSession')
+    Question = apps.get_model('game', 'Question')
+    for session in GameSession.objects.filter(status='in_progress'):
+        question_ids = list(
+            Question.objects
+            .filter(
+                is_deleted=False,
+                collections__in=session.question_collections.filter(is_deleted=False)
+            )
+            .exclude(round__game_session=session)
+            .values_list('id', flat=True)
+            .distinct()
+        )
+        random.shuffle(question_ids)
+        session.question_deck = question_ids[:max(session.round_count - session.current_round, 0)]
+        session.save(update_fields=['question_deck'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0025_gamesession_current_round'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='question_deck',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(backfill_question_deck, migrations.RunPython.noop),
+    ]
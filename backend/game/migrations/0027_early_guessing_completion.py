@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:20
+
+from django.db import migrations, models
+
+
+def backfill_guess_counters(apps, schema_editor):
+    GameSession = apps.get_model('game', 'GameSession')
+    Participant = apps.get_model('game', 'Participant')
+    Participant.objects.filter(guesses_made__isnull=False).update(has_guessed=True)
+    for session in GameSession.objects.filter(status='guessing'):
+        humans = Participant.objects.filter(game_session=session, is_active=True, is_npc=False)
+        session.guessers_expected = humans.count()
+        session.guessers_done = humans.filter(has_guessed=True).count()
+        session.save(update_fields=['guessers_expected', 'guessers_done'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0026_gamesession_question_deck'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='guessers_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='guessers_expected',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='has_guessed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(backfill_guess_counters, migrations.RunPython.noop),
+    ]
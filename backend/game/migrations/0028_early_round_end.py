@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0027_early_guessing_completion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='early_round_end',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='last_answered_round',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='answers',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='expected_answers',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
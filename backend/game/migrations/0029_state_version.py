@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0028_early_round_end'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='state_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0030_outbox_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='away',
+            field=models.BooleanField(default=False),
+        ),
+    ]
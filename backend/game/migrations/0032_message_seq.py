@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:40
+
+from django.db import migrations, models
+
+
+def backfill_message_seq(apps, schema_editor):
+    Message = apps.get_model('game', 'Message')
+    GameSession = apps.get_model('game', 'GameSession')
+    last_seq = {}
+    updated = []
+    for message in Message.objects.select_related('round').order_by('sent_at', 'id'):
+        session_id = message.round.game_session_id
+        last_seq[session_id] = last_seq.get(session_id, 0) + 1
+        message.seq = last_seq[session_id]
+        updated.append(message)
+    Message.objects.bulk_update(updated, ['seq'], batch_size=500)
+    for session_id, seq in last_seq.items():
+        GameSession.objects.filter(id=session_id).update(message_seq=seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0031_participant_away'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='message_seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_message_seq, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['round', 'seq'], name='message_round_seq_idx'),
+        ),
+    ]
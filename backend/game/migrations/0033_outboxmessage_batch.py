@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0032_message_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='batch',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_message_game_session(apps, schema_editor):
+    Message = apps.get_model('game', 'Message')
+    Round = apps.get_model('game', 'Round')
+    Message.objects.update(game_session_id=models.Subquery(
+        Round.objects.filter(id=models.OuterRef('round_id')).values('game_session_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0034_outboxmessage_lag'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_round_seq_idx',
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='game_session',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='game.gamesession'),
+        ),
+        migrations.RunPython(backfill_message_game_session, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['game_session', 'seq'], name='message_session_seq_idx'),
+        ),
+    ]
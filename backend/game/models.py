@@ -1,7 +1,7 @@
 # game/models.py
 
 import uuid, os
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
@@ -66,17 +66,50 @@ class GameSession(models.Model):
     round_length = models.IntegerField(default=60)  # Round duration in seconds
     round_count = models.IntegerField(default=3)    # Total number of rounds for the session
     guess_timer = models.IntegerField(default=60)  # Timer (in seconds) for guessing phase
+    early_round_end = models.BooleanField(default=False) # End rounds once everyone has answered
     guess_deadline = models.DateTimeField(null=True, blank=True) # Deadline for submitting guesses
+    # When the session next needs a phase transition (current round's end_time
+    # or guess_deadline), indexed so the checkers only look at due sessions
+    next_deadline = models.DateTimeField(null=True, blank=True)
+    current_round = models.PositiveIntegerField(default=0) # Number of the latest round
+    # Shuffled ids of the questions still to be asked, built at start_game
+    question_deck = models.JSONField(default=list, blank=True)
+    # Active humans expected to guess and how many have, so the guessing
+    # phase can end as soon as everyone is done
+    guessers_expected = models.PositiveIntegerField(default=0)
+    guessers_done = models.PositiveIntegerField(default=0)
     npc_sequence = models.PositiveIntegerField(default=0) # NPC name id
+    # Bumped on every lobby state change; patches broadcast to clients carry
+    # it so they can tell when they have missed one
+    state_version = models.PositiveIntegerField(default=0)
+    # Last Message.seq handed out in this room
+    message_seq = models.PositiveIntegerField(default=0)
     question_collections = models.ManyToManyField(
         'QuestionCollection', blank=True, related_name='game_sessions'
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_deadline'], name='session_deadline_idx'),
+        ]
+
     def __str__(self):
         return f"Session {self.code} ({self.status})"
 
+    # Counters that only move through F() increments; a full save of a
+    # stale instance must not roll them back
+    COUNTER_FIELDS = ('state_version', 'message_seq')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 def generate_secret():
     return uuid.uuid4().hex
 
@@ -100,6 +133,11 @@ class Participant(models.Model):
     secret = models.CharField(max_length=64, default=generate_secret)
     is_host = models.BooleanField(default=False)
     is_npc = models.BooleanField(default=False)
+    has_guessed = models.BooleanField(default=False)
+    # Marked inactive by the presence sweep (not by leaving or a kick), so a
+    # reconnect makes them active again
+    away = models.BooleanField(default=False)
+    last_answered_round = models.PositiveIntegerField(default=0)
 
     class Meta:
         constraints = [
@@ -203,7 +241,12 @@ class QuestionCollection(SoftDeleteModel):
             raise ValidationError(
                 "Negalite keisti klausimų kolekcijos, kuri naudojama vykstančiame žaidime."
             )
-        return super().save(*args, **kwargs)
+        changed = self.pk is not None
+        super().save(*args, **kwargs)
+        if changed:
+            # Renamed or deleted: lobbies listing it must not keep a cached copy
+            from .utils import collection_changed
+            collection_changed(self)
 
 class Round(models.Model):
     game_session = models.ForeignKey(
@@ -214,6 +257,9 @@ class Round(models.Model):
     round_number = models.PositiveIntegerField()
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
+    # Participants expected to answer and how many have (early_round_end only)
+    expected_answers = models.PositiveIntegerField(default=0)
+    answers = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ('game_session', 'round_number')
@@ -228,6 +274,11 @@ class Message(models.Model):
     round = models.ForeignKey(
         Round, on_delete=models.CASCADE, related_name='messages'
     )
+    # Copy of round.game_session, set on save, so the room's chat can be
+    # read in seq order from one index
+    game_session = models.ForeignKey(
+        GameSession, on_delete=models.CASCADE, related_name='messages', null=True
+    )
     text = models.TextField()
     sent_at = models.DateTimeField(auto_now_add=True)
     MESSAGE_TYPE_CHOICES = (
@@ -237,6 +288,32 @@ class Message(models.Model):
     message_type = models.CharField(
         max_length=10, choices=MESSAGE_TYPE_CHOICES, default='chat'
     )
+    # Position in the room's chat, 1, 2, 3...; clients resume after the
+    # last one they have
+    seq = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['game_session', 'seq'], name='message_session_seq_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.seq:
+            # The session row stays locked from the increment until the
+            # insert commits, so seq order is also commit order and a
+            # client reading "after N" can never miss a lower seq later
+            with transaction.atomic():
+                session_id = self.round.game_session_id
+                self.game_session_id = session_id
+                GameSession.objects.filter(id=session_id).update(
+                    message_seq=models.F('message_seq') + 1
+                )
+                self.seq = GameSession.objects.values_list(
+                    'message_seq', flat=True
+                ).get(id=session_id)
+                super().save(*args, **kwargs)
+            return
+        super().save(*args, **kwargs)
 
     def __str__(self):
         if self.message_type == 'system':
@@ -296,4 +373,24 @@ class Guess(models.Model):
         else:
             guessed_participant_name = "Unknown"
 
-        return f"{guesser_name} guessed {self.guessed_character.name} for {guessed_participant_name}"
\ No newline at end of file
+        return f"{guesser_name} guessed {self.guessed_character.name} for {guessed_participant_name}"
+
+
+class OutboxMessage(models.Model):
+    """
+    A channel layer event written in the same transaction as the change it
+    announces, published after commit by game.tasks.dispatch_outbox.
+    """
+    group_name = models.CharField(max_length=100)
+    event = models.TextField() # JSON; encoded by utils.encode_event when published
+    # Set on events written inside one batch_broadcasts() block; adjacent
+    # lobby updates of the same batch and group are published as one frame
+    batch = models.CharField(max_length=32, blank=True, default='')
+    # Set inside utils.measure_broadcast_lag(): the histogram that records how
+    # late the event is published relative to ``deadline``
+    lag_metric = models.CharField(max_length=64, blank=True, default='')
+    deadline = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Outbox {self.id} -> {self.group_name}"
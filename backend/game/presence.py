@@ -0,0 +1,214 @@
+# game/presence.py
+
+import asyncio, threading, time
+from collections import defaultdict
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from .models import Participant
+
+def write_last_seen(seen):
+    """Store {participant_id: datetime} in Participant.last_seen, one bulk UPDATE."""
+    Participant.objects.bulk_update(
+        [Participant(id=participant_id, last_seen=at) for participant_id, at in seen.items()],
+        ['last_seen'],
+        batch_size=500,
+    )
+
+class HeartbeatBuffer:
+    """
+    Per-process buffer of the latest ping time of each participant, written
+    to the database every ``interval`` seconds instead of on every ping.
+    A participant pinging several times between flushes costs one row in
+    one UPDATE; a flush with no pings costs nothing.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.seen = {}
+        self._task = None
+
+    def record(self, participant_id, at):
+        self.seen[participant_id] = at
+        self._ensure_flusher()
+
+    def drain(self):
+        seen, self.seen = self.seen, {}
+        return seen
+
+    async def flush(self):
+        seen = self.drain()
+        if not seen:
+            return 0
+        try:
+            await sync_to_async(write_last_seen)(seen)
+        except Exception as e:
+            print(f"⚠️ Could not store {len(seen)} heartbeats: {e}")
+            # Keep them for the next flush unless newer pings replaced them
+            for participant_id, at in seen.items():
+                self.seen.setdefault(participant_id, at)
+            return 0
+        return len(seen)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def _ensure_flusher(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._flush_loop())
+
+heartbeats = HeartbeatBuffer(settings.PRESENCE_FLUSH_INTERVAL)
+
+
+class MemoryPresence:
+    """
+    Presence kept in this process only; for development and tests, or a
+    single web process. Same interface as RedisPresence.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # code -> participant id -> last time known connected (epoch seconds)
+        self.seen = defaultdict(dict)
+        # code -> participant id -> open sockets
+        self.connections = defaultdict(lambda: defaultdict(int))
+
+    def connect(self, code, participant_id, at=None):
+        with self.lock:
+            self.connections[code][participant_id] += 1
+            self.seen[code][participant_id] = at or time.time()
+
+    def disconnect(self, code, participant_id, at=None):
+        with self.lock:
+            conns = self.connections[code]
+            conns[participant_id] = max(0, conns[participant_id] - 1)
+            self.seen[code][participant_id] = at or time.time()
+
+    def touch(self, code, participant_id, at=None):
+        with self.lock:
+            self.seen[code][participant_id] = at or time.time()
+
+    def last_seen(self, code):
+        with self.lock:
+            return dict(self.seen[code])
+
+    def online(self, code, now=None):
+        cutoff = (now or time.time()) - settings.PRESENCE_TTL
+        with self.lock:
+            return {
+                participant_id for participant_id, at in self.seen[code].items()
+                if at >= cutoff and self.connections[code][participant_id] > 0
+            }
+
+class RedisPresence:
+    """
+    Presence shared by every web process, in two Redis keys per room: a
+    sorted set of participant ids scored by the last time they were known
+    to be connected (refreshed on connect, heartbeat and disconnect), and a
+    hash of open socket counts. A participant is online while they have a
+    socket and a fresh score; the score going stale covers processes that
+    died without decrementing.
+    """
+
+    KEY_TIMEOUT = 24 * 60 * 60
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def _keys(self, code):
+        return f'presence:{code}:seen', f'presence:{code}:conns'
+
+    def _write(self, code, participant_id, at, delta=0):
+        seen_key, conns_key = self._keys(code)
+        pipe = self.client.pipeline()
+        pipe.zadd(seen_key, {participant_id: at or time.time()})
+        if delta:
+            pipe.hincrby(conns_key, participant_id, delta)
+        pipe.expire(seen_key, self.KEY_TIMEOUT)
+        pipe.expire(conns_key, self.KEY_TIMEOUT)
+        pipe.execute()
+
+    def connect(self, code, participant_id, at=None):
+        self._write(code, participant_id, at, 1)
+
+    def disconnect(self, code, participant_id, at=None):
+        self._write(code, participant_id, at, -1)
+
+    def touch(self, code, participant_id, at=None):
+        self._write(code, participant_id, at)
+
+    def last_seen(self, code):
+        seen_key, _ = self._keys(code)
+        return {
+            int(participant_id): at
+            for participant_id, at in self.client.zrange(seen_key, 0, -1, withscores=True)
+        }
+
+    def online(self, code, now=None):
+        seen_key, conns_key = self._keys(code)
+        cutoff = (now or time.time()) - settings.PRESENCE_TTL
+        fresh = self.client.zrangebyscore(seen_key, cutoff, '+inf')
+        if not fresh:
+            return set()
+        counts = self.client.hmget(conns_key, fresh)
+        return {
+            int(participant_id) for participant_id, count in zip(fresh, counts)
+            if count is not None and int(count) > 0
+        }
+
+_stores = {}
+
+def get_presence():
+    """The presence store selected by settings.PRESENCE_BACKEND ('redis' or 'memory')."""
+    backend = settings.PRESENCE_BACKEND
+    if backend not in _stores:
+        if backend == 'redis':
+            _stores[backend] = RedisPresence(settings.PRESENCE_REDIS_URL)
+        elif backend == 'memory':
+            _stores[backend] = MemoryPresence()
+        else:
+            raise ValueError(f"Unknown PRESENCE_BACKEND {backend!r}")
+    return _stores[backend]
+
+def sweep_away(now=None):
+    """
+    Mark inactive every active human whose room has not seen them for
+    settings.PRESENCE_GRACE_SECONDS. Candidates come from the buffered
+    Participant.last_seen; the presence store has the final say, so a
+    participant whose heartbeats are not flushed yet is left alone.
+    Returns the participants marked away.
+    """
+    from .utils import mark_away
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=settings.PRESENCE_GRACE_SECONDS)
+    stale = (
+        Participant.objects
+        .filter(
+            is_active=True, is_npc=False, last_seen__lt=cutoff,
+            game_session__status__in=['pending', 'in_progress', 'guessing'],
+        )
+        .select_related('game_session', 'user')
+    )
+    presence = get_presence()
+    by_room = defaultdict(list)
+    for participant in stale:
+        by_room[participant.game_session.code].append(participant)
+
+    marked = []
+    for code, participants in by_room.items():
+        online = presence.online(code, now.timestamp())
+        seen = presence.last_seen(code)
+        for participant in participants:
+            if participant.id in online or seen.get(participant.id, 0) >= cutoff.timestamp():
+                continue
+            try:
+                if mark_away(participant):
+                    marked.append(participant)
+            except Exception as e:
+                print(f"⚠️ Could not mark participant {participant.id} away: {e}")
+    return marked
@@ -0,0 +1,86 @@
+# game/protocol.py
+
+import msgpack
+
+# Lobby sockets speak JSON unless the client offers this subprotocol, in
+# which case frames are binary MessagePack with the short keys below
+COMPACT_SUBPROTOCOL = 'meidvainis.msgpack.v1'
+
+# Field name -> code. Append only: clients keep their own copy of the table,
+# and codes must never be reused for another field
+KEY_CODES = {
+    'type': 't',
+    'version': 'v',
+    'op': 'o',
+    'code': 'c',
+    'status': 's',
+    'players': 'p',
+    'player': 'pl',
+    'player_id': 'pi',
+    'id': 'i',
+    'username': 'u',
+    'characterSelected': 'cs',
+    'is_host': 'h',
+    'is_npc': 'n',
+    'is_active': 'a',
+    'assigned_character': 'ac',
+    'name': 'nm',
+    'image': 'im',
+    'points': 'pt',
+    'correctGuesses': 'cg',
+    'guesses': 'g',
+    'guesser_id': 'gi',
+    'guessed_character_name': 'gn',
+    'is_correct': 'ic',
+    'score_breakdown': 'sb',
+    'description': 'd',
+    'host_id': 'hi',
+    'settings': 'st',
+    'round_length': 'rl',
+    'round_count': 'rc',
+    'guess_timer': 'gt',
+    'guess_deadline': 'gd',
+    'early_round_end': 'ee',
+    'question_collections': 'qc',
+    'messages': 'ms',
+    'message': 'm',
+    'text': 'tx',
+    'sentAt': 'sa',
+    'characterName': 'cn',
+    'characterImage': 'ci',
+    'system': 'sy',
+    'roundNumber': 'rn',
+    'question': 'q',
+    'round': 'r',
+    'round_number': 'rnm',
+    'end_time': 'et',
+    'options': 'ol',
+    'character_id': 'chi',
+    'character_name': 'chn',
+    'character_image': 'chim',
+    'error': 'e',
+    'participant_id': 'pid',
+    'secret': 'sc',
+    'seq': 'sq',
+    'after_seq': 'as',
+    'has_more': 'hm',
+    'last_seq': 'ls',
+    'messages_has_more': 'mhm',
+}
+CODE_KEYS = {code: key for key, code in KEY_CODES.items()}
+assert len(CODE_KEYS) == len(KEY_CODES), "duplicate key code"
+
+def _rename(value, table):
+    if isinstance(value, dict):
+        return {table.get(k, k): _rename(v, table) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rename(v, table) for v in value]
+    return value
+
+def pack(data):
+    """Encode an outgoing frame for a compact client."""
+    return msgpack.packb(_rename(data, KEY_CODES), use_bin_type=True)
+
+def unpack(payload):
+    """Decode a frame sent by a compact client."""
+    return _rename(msgpack.unpackb(payload, raw=False), CODE_KEYS)
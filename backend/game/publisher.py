@@ -0,0 +1,84 @@
+# game/publisher.py
+
+import asyncio, atexit, os, threading
+from concurrent.futures import Future
+
+class Publisher:
+    """
+    Channel layer sends for sync code (views, Celery tasks) made from one
+    long-lived event loop on a daemon thread. async_to_sync runs each call on
+    a fresh loop, and channels_redis keeps its connection pool per loop, so
+    every broadcast used to open and close its own Redis connections; here
+    the pool lives as long as the process.
+
+    Sends are made one at a time in the order they were handed over.
+    publish_many() returns at once with a Future for callers that need to
+    know they went out.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loop = None
+        self.queue = None
+        self.pid = None
+
+    def start(self):
+        with self.lock:
+            if self.loop is not None and self.pid == os.getpid():
+                return
+            # First use, or a forked child (Celery prefork) that inherited
+            # the parent's object but not its thread
+            loop = asyncio.new_event_loop()
+            queue = asyncio.Queue()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.create_task(self.drain(queue))
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            threading.Thread(target=run, name='broadcast-publisher', daemon=True).start()
+            ready.wait()
+            self.loop, self.queue, self.pid = loop, queue, os.getpid()
+
+    def publish_many(self, channel_layer, messages):
+        """Queue ``group_send(group_name, event)`` for each pair, in order."""
+        future = Future()
+        self.start()
+        self.loop.call_soon_threadsafe(
+            self.queue.put_nowait, (channel_layer, list(messages), future)
+        )
+        return future
+
+    def call(self, func):
+        """Run the blocking ``func()`` on the loop's thread pool; returns a Future."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.run_blocking(func), self.loop)
+
+    async def run_blocking(self, func):
+        return await asyncio.get_running_loop().run_in_executor(None, func)
+
+    async def drain(self, queue):
+        while True:
+            channel_layer, messages, future = await queue.get()
+            try:
+                for group_name, event in messages:
+                    await channel_layer.group_send(group_name, event)
+            except Exception as e:
+                print(f"⚠️ Broadcast to {group_name} failed: {e}")
+                # Without the traceback: it holds this coroutine's frame,
+                # which the caller's exception handling may clear
+                future.set_exception(e.with_traceback(None))
+            else:
+                future.set_result(len(messages))
+
+    def flush(self, timeout=None):
+        """Wait until everything handed over so far has been sent."""
+        if self.loop is None or self.pid != os.getpid():
+            return
+        self.publish_many(None, []).result(timeout)
+
+publisher = Publisher()
+# Don't lose broadcasts queued just before a worker exits
+atexit.register(publisher.flush, 5)
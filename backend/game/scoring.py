@@ -1,55 +1,45 @@
 # backend/game/scoring.py
 
-from django.db.models import Q
-from .models import Round, Guess
+from collections import defaultdict
+from .models import Guess, Message, Participant
 
-def compute_score_breakdown(participant):
-    session = participant.game_session
+def _display_name(participant):
+    return participant.user.username if participant.user else participant.guest_name
+
+def score_breakdown(rounds_answered, correct_made, correct_received, total_humans):
+    """
+    Breakdown and total for one participant from data already loaded:
+    the round numbers they sent a message in, their correct guesses (with
+    guessed_participant and guessed_character), the correct guesses about
+    them (with guesser) and how many other active humans could guess.
+    """
     breakdown = []
 
     # Points for sending a chat message in each round
-    rounds_with_msgs = (
-        Round.objects
-             .filter(game_session=session, messages__participant=participant)
-             .distinct()
-    )
-    for rnd in rounds_with_msgs:
+    for round_number in rounds_answered:
         breakdown.append({
-            'description': f'už atsakymą {rnd.round_number} raunde',
+            'description': f'už atsakymą {round_number} raunde',
             'points': 50
         })
 
     # Points for each correct guess you made
-    correct_guesses = Guess.objects.filter(guesser=participant, is_correct=True)
-    for guess in correct_guesses:
-        if guess.guessed_participant and guess.guessed_participant.is_npc:
+    for guess in correct_made:
+        if guess.guessed_participant.is_npc:
             breakdown.append({
                 'description': f'už teisingai atpažintą robotą „{guess.guessed_character.name}“',
                 'points': 50
             })
         else:
-            target = guess.guessed_participant
-            target_name = target.user.username if target.user else target.guest_name
             breakdown.append({
-                'description': f'už teisingai atpažintą žaidėją {target_name}',
+                'description': f'už teisingai atpažintą žaidėją {_display_name(guess.guessed_participant)}',
                 'points': 100
             })
 
-
     # Points for being guessed by others
         # If nobody guessed you - 0
         # If everyone guessed you - 0
         # Otherwise, +50 per person who guessed you correctly
-    human_guessers = session.participants.filter(
-        is_active=True, is_npc=False
-    ).exclude(id=participant.id)
-    total_humans = human_guessers.count()
-
-    correct_received = Guess.objects.filter(
-        guessed_participant=participant, is_correct=True
-    )
-    correct_count = correct_received.count()
-
+    correct_count = len(correct_received)
     if correct_count == 0:
         # nobody guessed you
         breakdown.append({
@@ -65,12 +55,71 @@ def compute_score_breakdown(participant):
     else:
         # some, but not all guessed you
         for guess in correct_received:
-            g = guess.guesser
-            g_name = g.user.username if g.user else g.guest_name
             breakdown.append({
-                'description': f'už tai, kad {g_name} atspėjo tavo personažą',
+                'description': f'už tai, kad {_display_name(guess.guesser)} atspėjo tavo personažą',
                 'points': 50
             })
 
     total = sum(item['points'] for item in breakdown)
     return breakdown, total
+
+def session_guesses(session):
+    """All guesses of the session, with what scoring and results show loaded."""
+    return list(
+        Guess.objects
+        .filter(guessed_participant__game_session=session)
+        .select_related('guessed_character', 'guesser__user', 'guessed_participant__user')
+        .order_by('id')
+    )
+
+def session_score_breakdowns(session, participants=None, guesses=None):
+    """
+    {participant id: (breakdown, total)} for everyone in the session, from a
+    fixed number of queries however many play. Callers that already hold
+    the participants (with user) or session_guesses() can pass them in.
+    """
+    if participants is None:
+        participants = list(session.participants.select_related('user'))
+    if guesses is None:
+        guesses = session_guesses(session)
+
+    rounds_answered = defaultdict(set)
+    for participant_id, round_number in (
+        Message.objects
+        .filter(round__game_session=session, participant__isnull=False)
+        .values_list('participant_id', 'round__round_number')
+        .distinct()
+    ):
+        rounds_answered[participant_id].add(round_number)
+
+    correct_made, correct_received = defaultdict(list), defaultdict(list)
+    for guess in guesses:
+        if guess.is_correct:
+            correct_made[guess.guesser_id].append(guess)
+            correct_received[guess.guessed_participant_id].append(guess)
+
+    active_humans = {p.id for p in participants if p.is_active and not p.is_npc}
+    return {
+        p.id: score_breakdown(
+            sorted(rounds_answered[p.id]),
+            correct_made[p.id],
+            correct_received[p.id],
+            len(active_humans - {p.id}),
+        )
+        for p in participants
+    }
+
+def compute_session_scores(session):
+    """
+    Score everyone in the session and save their points with one
+    bulk_update. Returns {participant: (breakdown, total)}.
+    """
+    participants = list(session.participants.select_related('user'))
+    breakdowns = session_score_breakdowns(session, participants)
+    for participant in participants:
+        participant.points = breakdowns[participant.id][1]
+    Participant.objects.bulk_update(participants, ['points'])
+    return {participant: breakdowns[participant.id] for participant in participants}
+
+def compute_score_breakdown(participant):
+    return session_score_breakdowns(participant.game_session)[participant.id]
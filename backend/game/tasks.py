@@ -1,13 +1,18 @@
 # backend/game/tasks.py
 
-import random
+import random, time
 from openai import OpenAI
 from celery import shared_task
 from django.utils import timezone
 from django.conf import settings
 
+from . import metrics
 from .models import Round, Participant, Message, GameSession
-from .utils import check_and_advance_rounds, broadcast_lobby_update, broadcast_chat_message
+from .utils import (
+    check_and_advance_rounds, advance_sessions, advance_session_round,
+    end_session_game, finish_game, broadcast_chat_message, record_answer,
+    batch_broadcasts, publish_outbox
+)
 
 # instantiate the DeepSeek client once per worker
 _client = OpenAI(
@@ -20,22 +25,48 @@ def run_round_check():
     print("⏰ Celery: Checking rounds...")
     check_and_advance_rounds()
 
+@shared_task
+def run_round_check_shard(session_ids):
+    advance_sessions(session_ids)
+
+@shared_task
+def advance_round(session_id, round_number):
+    advance_session_round(session_id, round_number)
+
 @shared_task
 def run_game_end_check():
+    started = time.perf_counter()
     now = timezone.now()
-    sessions = GameSession.objects.filter(status='guessing', guess_deadline__lte=now)
+    sessions = list(GameSession.objects.filter(status='guessing', next_deadline__lte=now))
+    metrics.observe('tick_scan_duration_seconds', time.perf_counter() - started)
+    metrics.observe('tick_sessions_examined', len(sessions))
     for session in sessions:
-        print(f"Ending game for session {session.code}")
-        from .scoring import compute_score_breakdown
-        for participant in session.participants.all():
-            breakdown, total = compute_score_breakdown(participant)
-            participant.points = total
-            participant.save()
-        session.status = 'completed'
-        session.save()
-        broadcast_lobby_update(session)
+        try:
+            finish_game(session)
+        except Exception as e:
+            print(f"⚠️ Could not end game for session {session.code}: {e}")
     return "Game end check complete"
 
+@shared_task
+def end_game(session_id):
+    end_session_game(session_id)
+
+@shared_task
+def dispatch_outbox():
+    # Drain everything, including events committed while we were sending
+    sent = publish_outbox()
+    while sent:
+        sent = publish_outbox()
+    if sent is None:
+        # Another dispatcher is publishing; it may have looked before our
+        # events committed, so check again shortly
+        dispatch_outbox.apply_async(countdown=1)
+
+@shared_task
+def sweep_presence():
+    from .presence import sweep_away
+    sweep_away()
+
 @shared_task
 def schedule_npc_responses(round_id):
     try:
@@ -115,6 +146,7 @@ def npc_generate_and_schedule(round_id, participant_id):
     )
 
 @shared_task
+@batch_broadcasts()
 def broadcast_npc_response(round_id, participant_id, text):
     try:
         rnd = Round.objects.select_related('game_session').get(id=round_id)
@@ -139,3 +171,4 @@ def broadcast_npc_response(round_id, participant_id, text):
         message_type='chat'
     )
     broadcast_chat_message(session.code, msg)
+    record_answer(session, npc, rnd)
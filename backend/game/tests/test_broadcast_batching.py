@@ -0,0 +1,96 @@
+# game/tests/test_broadcast_batching.py
+
+import json
+from unittest import mock
+from asgiref.sync import async_to_sync
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from game import utils
+from game.consumers import LobbyConsumer
+from game.models import GameSession, Participant, QuestionCollection, Question, Round
+
+
+def lobby_event(n):
+    return {'type': 'lobby_update', 'data': {'type': 'chat_update', 'n': n}}
+
+
+class BatchBroadcastsTests(TestCase):
+    def test_lobby_updates_merge_into_one_ordered_frame(self):
+        with utils.capture_broadcasts() as sent:
+            with utils.batch_broadcasts():
+                utils._group_send('lobby_A', lobby_event(1))
+                utils._group_send(utils.GAME_CLOCK_GROUP, {'type': 'clock.deadline'})
+                utils._group_send('lobby_A', lobby_event(2))
+                utils._group_send('lobby_B', lobby_event(3))
+                utils._group_send('lobby_A', lobby_event(4))
+                self.assertEqual(sent, [])
+
+        frames = dict(sent)
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(frames['lobby_A']['data']['type'], 'batch')
+        self.assertEqual([m['n'] for m in frames['lobby_A']['data']['messages']], [1, 2, 4])
+        # A lone update is sent as is, other event types are left alone
+        self.assertEqual(frames['lobby_B'], lobby_event(3))
+        self.assertEqual(frames[utils.GAME_CLOCK_GROUP], {'type': 'clock.deadline'})
+
+    def test_nested_batches_flush_once(self):
+        with utils.capture_broadcasts() as sent:
+            with utils.batch_broadcasts():
+                with utils.batch_broadcasts():
+                    utils._group_send('lobby_A', lobby_event(1))
+                self.assertEqual(sent, [])
+                utils._group_send('lobby_A', lobby_event(2))
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(len(sent[0][1]['data']['messages']), 2)
+
+    def test_round_transition_is_one_frame(self):
+        session = GameSession.objects.create(code='BATCH1', status='in_progress', round_count=2)
+        Participant.objects.create(guest_identifier='g1', guest_name='G', game_session=session)
+        qc = QuestionCollection.objects.create(name='QC')
+        questions = [Question.objects.create(text=f'Q{i}') for i in range(2)]
+        qc.questions.set(questions)
+        session.question_collections.add(qc)
+        Round.objects.create(
+            game_session=session, question=questions[0], round_number=1,
+            end_time=timezone.now() - timedelta(seconds=1)
+        )
+        session.current_round = 1
+        session.next_deadline = timezone.now() - timedelta(seconds=1)
+        session.question_deck = [questions[1].id]
+        session.save()
+
+        with mock.patch.object(utils, 'schedule_round_end'), \
+                utils.capture_broadcasts() as sent:
+            self.assertTrue(utils.advance_session(session))
+
+        self.assertEqual(len(sent), 1)
+        group_name, event = sent[0]
+        self.assertEqual(group_name, 'lobby_BATCH1')
+        self.assertEqual(
+            [m['type'] for m in event['data']['messages']],
+            ['chat_update', 'round_update']
+        )
+
+
+class EncodedBroadcastTests(TestCase):
+    @override_settings(SOCKET_COMPACT_PROTOCOL=False)
+    def test_event_is_encoded_once_at_the_sender(self):
+        data = {'type': 'chat_update', 'message': {'text': 'labas'}}
+        event = utils.encode_event({'type': 'lobby_update', 'data': data})
+        self.assertEqual(
+            event, {'type': 'lobby_update', 'kind': 'chat_update', 'text': json.dumps(data)}
+        )
+        # Non-lobby events pass through untouched
+        clock = {'type': 'clock.deadline', 'session_id': 1}
+        self.assertIs(utils.encode_event(clock), clock)
+
+    def test_consumer_writes_text_as_is(self):
+        consumer = LobbyConsumer()
+        with mock.patch.object(consumer, 'send') as send:
+            async_to_sync(consumer.lobby_update)({'type': 'lobby_update', 'text': '{"a": 1}'})
+            async_to_sync(consumer.lobby_update)({'type': 'lobby_update', 'data': {'a': 1}})
+        self.assertEqual(
+            [c.kwargs['text_data'] for c in send.call_args_list], ['{"a": 1}', '{"a": 1}']
+        )
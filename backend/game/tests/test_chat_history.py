@@ -0,0 +1,107 @@
+# game/tests/test_chat_history.py
+
+import json
+from datetime import timedelta
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from game import utils
+from game.routing import websocket_urlpatterns
+from game.models import GameSession, Participant, Question, Round, Message
+
+
+class ChatHistoryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.session = GameSession.objects.create(
+            code='HIST01', status='in_progress', current_round=1
+        )
+        self.participant = Participant.objects.create(
+            guest_identifier='g1', guest_name='Guest', game_session=self.session
+        )
+        self.round = Round.objects.create(
+            game_session=self.session, question=Question.objects.create(text='Q'),
+            round_number=1, end_time=timezone.now() + timedelta(seconds=60)
+        )
+        for n in range(5):
+            Message.objects.create(participant=self.participant, round=self.round, text=f'm{n}')
+
+    def test_messages_are_numbered_per_room(self):
+        other = GameSession.objects.create(code='HIST02')
+        other_round = Round.objects.create(
+            game_session=other, question=self.round.question,
+            round_number=1, end_time=timezone.now()
+        )
+        message = Message.objects.create(round=other_round, text='x', message_type='system')
+        self.assertEqual(message.seq, 1)
+        self.assertEqual(message.game_session_id, other.id)
+        self.assertEqual(
+            list(Message.objects.filter(round=self.round).order_by('id').values_list('seq', flat=True)),
+            [1, 2, 3, 4, 5]
+        )
+
+    def test_full_save_keeps_message_seq(self):
+        stale = GameSession.objects.get(id=self.session.id)
+        Message.objects.create(participant=self.participant, round=self.round, text='m5')
+        stale.round_length = 45
+        stale.save()
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.message_seq, 6)
+
+    def test_history_pages_after_cursor(self):
+        page = utils.chat_history(self.session, after_seq=1, limit=2)
+        self.assertEqual([m['text'] for m in page['messages']], ['m1', 'm2'])
+        self.assertTrue(page['has_more'])
+        self.assertEqual(page['last_seq'], 3)
+
+        page = utils.chat_history(self.session, after_seq=page['last_seq'], limit=2)
+        self.assertEqual([m['seq'] for m in page['messages']], [4, 5])
+        self.assertFalse(page['has_more'])
+
+        page = utils.chat_history(self.session, after_seq=5)
+        self.assertEqual(page, {'messages': [], 'has_more': False, 'last_seq': 5})
+
+    def test_rest_endpoint_checks_secret(self):
+        params = {'code': 'HIST01', 'participant_id': self.participant.id, 'after': 3}
+        resp = self.client.get(reverse('chat_history'), {**params, 'secret': 'wrong'})
+        self.assertEqual(resp.status_code, 403)
+
+        resp = self.client.get(reverse('chat_history'), {**params, 'secret': self.participant.secret})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([m['text'] for m in resp.json()['messages']], ['m3', 'm4'])
+
+    def test_reconnect_gets_only_the_gap(self):
+        resp = self.client.post(reverse('join_room'), data={
+            'code': 'HIST01', 'participant_id': self.participant.id,
+            'secret': self.participant.secret, 'after_seq': 4,
+        }, format='json')
+        body = resp.json()
+        self.assertEqual([m['seq'] for m in body['messages']], [5])
+        self.assertFalse(body['messages_has_more'])
+
+    def test_live_message_carries_seq(self):
+        with utils.capture_broadcasts() as sent:
+            utils.send_system_message(self.round, 'Sistema')
+        self.assertEqual(sent[0][1]['data']['message']['seq'], 6)
+
+    @override_settings(BROADCAST_OUTBOX=False, PRESENCE_BACKEND='memory')
+    async def test_socket_resume_sends_the_gap(self):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns),
+            f'/ws/lobby/HIST01/?participant_id={self.participant.id}&secret={self.participant.secret}'
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        json.loads(await communicator.receive_from())
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'auth_ok'})
+
+        await communicator.send_json_to({'type': 'resume', 'after_seq': 3})
+        reply = await communicator.receive_json_from()
+        self.assertEqual(reply['type'], 'chat_history')
+        self.assertEqual([m['text'] for m in reply['messages']], ['m3', 'm4'])
+        self.assertEqual(reply['last_seq'], 5)
+        await communicator.disconnect()
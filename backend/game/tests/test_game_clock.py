@@ -0,0 +1,73 @@
+# game/tests/test_game_clock.py
+
+from unittest import mock
+from datetime import timedelta
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from game import utils
+from game.clock import GameClock
+from game.models import GameSession, QuestionCollection, Question, Round
+
+
+@override_settings(GAME_CLOCK='daemon')
+class GameClockTests(TestCase):
+    def setUp(self):
+        self.session = GameSession.objects.create(
+            code='CLOCK1', status='in_progress', round_count=2, current_round=1
+        )
+        qc = QuestionCollection.objects.create(name='QC')
+        q1 = Question.objects.create(text='Q1')
+        q2 = Question.objects.create(text='Q2')
+        qc.questions.add(q1, q2)
+        self.session.question_collections.add(qc)
+        self.round = Round.objects.create(
+            game_session=self.session,
+            question=q1,
+            round_number=1,
+            end_time=timezone.now() - timedelta(seconds=1)
+        )
+        self.session.next_deadline = self.round.end_time
+        self.session.question_deck = [q2.id]
+        self.session.save()
+
+        self.clock = GameClock()
+        patcher = mock.patch.object(self.clock.channel_layer, 'group_send', new_callable=mock.AsyncMock)
+        self.group_send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resync_loads_deadlines_from_database(self):
+        async_to_sync(self.clock.resync)()
+        self.assertEqual(
+            self.clock.pending[self.session.id],
+            (self.round.end_time, 'in_progress', 1)
+        )
+
+    def test_due_deadline_advances_and_broadcasts(self):
+        async_to_sync(self.clock.resync)()
+        self.assertEqual(async_to_sync(self.clock.run_due)(), 1)
+
+        new_round = self.session.rounds.get(round_number=2)
+        groups = {call.args[0] for call in self.group_send.call_args_list}
+        self.assertEqual(groups, {'lobby_CLOCK1'})
+        # The next round's deadline went straight back onto the heap
+        self.assertEqual(
+            self.clock.pending[self.session.id],
+            (new_round.end_time, 'in_progress', 2)
+        )
+
+    def test_superseded_entries_are_skipped(self):
+        now = timezone.now()
+        self.clock.push(self.session.id, 'in_progress', 1, now - timedelta(seconds=2))
+        self.clock.push(self.session.id, 'in_progress', 2, now - timedelta(seconds=1))
+        self.assertEqual(self.clock.pop_due(now), [(self.session.id, 'in_progress', 2)])
+
+    def test_schedule_round_end_notifies_clock(self):
+        with utils.capture_broadcasts() as sent:
+            utils.schedule_round_end(self.round)
+        self.assertEqual(len(sent), 1)
+        group_name, event = sent[0]
+        self.assertEqual(group_name, utils.GAME_CLOCK_GROUP)
+        self.assertEqual(event['session_id'], self.session.id)
+        self.assertEqual(event['round_number'], 1)
@@ -0,0 +1,155 @@
+# game/tests/test_lobby_patches.py
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+from django.urls import reverse
+from django.contrib.auth.models import User
+
+from game import utils
+from game.models import GameSession, Participant, Character, QuestionCollection
+
+
+class LobbyPatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='host', password='pw')
+        self.session = GameSession.objects.create(code='PATCH1')
+        self.host = Participant.objects.create(
+            user=self.user, game_session=self.session, is_host=True
+        )
+        self.guest = Participant.objects.create(
+            guest_identifier='g1', guest_name='Guest', game_session=self.session
+        )
+        self.char = Character.objects.create(name='Alice', is_public=True)
+
+    def post(self, name, data):
+        with utils.capture_broadcasts() as sent:
+            resp = self.client.post(reverse(name), data=data, format='json')
+        messages = []
+        for _, event in sent:
+            data = event['data']
+            messages += data['messages'] if data['type'] == 'batch' else [data]
+        return resp, messages
+
+    def test_select_character_sends_player_patch(self):
+        resp, sent = self.post('select_character', {
+            'code': 'PATCH1', 'participant_id': self.guest.id,
+            'secret': self.guest.secret, 'character_id': self.char.id,
+        })
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(sent), 1)
+        patch = sent[0]
+        self.assertEqual(patch['type'], 'lobby_patch')
+        self.assertEqual(patch['op'], 'player_updated')
+        self.assertEqual(patch['version'], 1)
+        self.assertEqual(patch['player']['id'], self.guest.id)
+        self.assertTrue(patch['player']['characterSelected'])
+        self.assertNotIn('players', patch)
+
+    def test_versions_increase_per_change(self):
+        _, first = self.post('select_character', {
+            'code': 'PATCH1', 'participant_id': self.guest.id,
+            'secret': self.guest.secret, 'character_id': self.char.id,
+        })
+        _, second = self.post('update_settings', {
+            'code': 'PATCH1', 'participant_id': self.host.id,
+            'secret': self.host.secret, 'round_length': 30, 'round_count': 2,
+        })
+        self.assertEqual(second[0]['op'], 'settings_updated')
+        self.assertEqual(second[0]['settings']['round_length'], 30)
+        self.assertEqual(second[0]['version'], first[0]['version'] + 1)
+
+    def test_guest_join_adds_player_and_reconnect_is_silent(self):
+        resp, sent = self.post('join_room', {'code': 'PATCH1', 'guest_username': 'New'})
+        # The first join of a room without collections also assigns them
+        self.assertEqual([p['op'] for p in sent], ['player_added', 'settings_updated'])
+        self.assertEqual(sent[0]['player']['username'], 'New')
+
+        _, sent = self.post('join_room', {
+            'code': 'PATCH1', 'participant_id': resp.json()['participant_id'],
+            'secret': resp.json()['secret'],
+        })
+        self.assertEqual(sent, [])
+
+    def test_kick_in_pending_removes_player(self):
+        _, sent = self.post('kick_player', {
+            'code': 'PATCH1', 'participant_id': self.host.id,
+            'secret': self.host.secret, 'target_participant_id': self.guest.id,
+        })
+        self.assertEqual(sent[0]['op'], 'player_removed')
+        self.assertEqual(sent[0]['player_id'], self.guest.id)
+
+    def test_full_save_keeps_version(self):
+        stale = GameSession.objects.get(id=self.session.id)
+        utils.bump_state_version(self.session)
+        stale.round_length = 45
+        stale.save()
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.state_version, 1)
+        self.assertEqual(self.session.round_length, 45)
+
+    def test_snapshot_carries_version(self):
+        with utils.capture_broadcasts() as sent:
+            utils.broadcast_lobby_update(self.session)
+        data = sent[0][1]['data']
+        self.assertEqual(data['type'], 'lobby_snapshot')
+        self.assertEqual(data['version'], 1)
+        self.assertEqual(len(data['players']), 2)
+
+    def test_deleted_collections_are_not_listed(self):
+        kept = QuestionCollection.objects.create(name='Kept')
+        removed = QuestionCollection.objects.create(name='Removed')
+        self.session.question_collections.add(kept, removed)
+        removed.delete()
+        collections = utils.serialize_settings(self.session)['question_collections']
+        self.assertEqual(collections, [{'id': kept.id, 'name': 'Kept'}])
+
+
+class LobbySnapshotCacheTests(TestCase):
+    def setUp(self):
+        self.session = GameSession.objects.create(code='SNAP01')
+        self.host = Participant.objects.create(
+            guest_identifier='h1', guest_name='Host',
+            game_session=self.session, is_host=True
+        )
+
+    def test_snapshot_is_served_from_cache(self):
+        first = utils.lobby_snapshot(self.session)
+        with self.assertNumQueries(0):
+            self.assertEqual(utils.lobby_snapshot(self.session), first)
+
+    def test_bump_invalidates_snapshot(self):
+        utils.lobby_snapshot(self.session)
+        Participant.objects.create(
+            guest_identifier='g1', guest_name='Guest', game_session=self.session
+        )
+        utils.bump_state_version(self.session)
+        data = utils.lobby_snapshot(self.session)
+        self.assertEqual(data['version'], 1)
+        self.assertEqual(len(data['players']), 2)
+
+    def test_collection_change_invalidates_snapshot(self):
+        collection = QuestionCollection.objects.create(name='Old')
+        self.session.question_collections.add(collection)
+        utils.lobby_snapshot(self.session)
+        collection.name = 'New'
+        with utils.capture_broadcasts() as sent:
+            collection.save()
+        self.assertEqual(sent[0][1]['data']['op'], 'settings_updated')
+        self.session.refresh_from_db()
+        data = utils.lobby_snapshot(self.session)
+        self.assertEqual(data['question_collections'], [{'id': collection.id, 'name': 'New'}])
+
+        with utils.capture_broadcasts():
+            collection.delete()
+        self.session.refresh_from_db()
+        self.assertEqual(utils.lobby_snapshot(self.session)['question_collections'], [])
+
+    def test_join_room_uses_snapshot(self):
+        resp = APIClient().post(reverse('join_room'), data={
+            'code': 'SNAP01', 'participant_id': self.host.id, 'secret': self.host.secret,
+        }, format='json')
+        body = resp.json()
+        self.assertEqual(body['version'], self.session.state_version)
+        self.assertEqual(body['host_id'], self.host.id)
+        self.assertEqual(body['participant_id'], self.host.id)
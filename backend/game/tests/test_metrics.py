@@ -0,0 +1,81 @@
+# game/tests/test_metrics.py
+
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from game import metrics, utils
+from game.models import GameSession, QuestionCollection, Question, Round
+
+
+class SchedulerMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_observe_fills_cumulative_buckets(self):
+        metrics.observe('round_transition_lag_seconds', 0.02)
+        metrics.observe('round_transition_lag_seconds', 0.3)
+        metrics.observe('round_transition_lag_seconds', 100)
+
+        data = metrics.snapshot()['round_transition_lag_seconds']
+        self.assertEqual(data['count'], 3)
+        self.assertAlmostEqual(data['sum'], 100.32)
+        self.assertEqual(data['buckets']['0.025'], 1)
+        self.assertEqual(data['buckets']['0.5'], 2)
+        self.assertEqual(data['buckets']['+Inf'], 3)
+        self.assertEqual(data['p50'], '0.5')
+        self.assertEqual(data['p99'], '+Inf')
+
+    def test_round_transition_records_lag(self):
+        session = GameSession.objects.create(
+            code='METR1', status='in_progress', round_count=2, current_round=1
+        )
+        qc = QuestionCollection.objects.create(name='QC')
+        q1, q2 = Question.objects.create(text='Q1'), Question.objects.create(text='Q2')
+        qc.questions.add(q1, q2)
+        session.question_collections.add(qc)
+        Round.objects.create(
+            game_session=session, question=q1, round_number=1,
+            end_time=timezone.now() - timedelta(seconds=2)
+        )
+        session.next_deadline = timezone.now() - timedelta(seconds=2)
+        session.question_deck = [q2.id]
+        session.save()
+
+        self.assertTrue(utils.advance_session(session))
+        data = metrics.snapshot()
+        self.assertEqual(data['round_transition_lag_seconds']['count'], 1)
+        self.assertGreaterEqual(data['round_transition_lag_seconds']['sum'], 2)
+        # Outboxed broadcasts count once they are published, once per transition
+        self.assertEqual(data['round_broadcast_lag_seconds']['count'], 0)
+        utils.publish_outbox()
+        self.assertEqual(metrics.snapshot()['round_broadcast_lag_seconds']['count'], 1)
+
+    def test_sweep_records_sessions_examined(self):
+        utils.check_and_advance_rounds()
+        data = metrics.snapshot()
+        self.assertEqual(data['tick_sessions_examined']['buckets']['0'], 1)
+        self.assertEqual(data['tick_scan_duration_seconds']['count'], 1)
+
+    def test_metrics_endpoint(self):
+        metrics.observe('tick_sessions_examined', 3)
+        resp = APIClient().get(reverse('scheduler_metrics'), REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b'tick_sessions_examined_bucket{le="5"} 1', resp.content)
+
+        resp = APIClient().get(reverse('scheduler_metrics'), REMOTE_ADDR='10.0.0.9')
+        self.assertEqual(resp.status_code, 403)
+
+    @override_settings(TRUSTED_PROXIES=['172.16.0.0/12'])
+    def test_metrics_client_ip_behind_trusted_proxy(self):
+        url = reverse('scheduler_metrics')
+        resp = APIClient().get(url, REMOTE_ADDR='172.18.0.5', HTTP_X_REAL_IP='127.0.0.1')
+        self.assertEqual(resp.status_code, 200)
+        # A client outside the allowlist, and the header sent past the proxy
+        resp = APIClient().get(url, REMOTE_ADDR='172.18.0.5', HTTP_X_REAL_IP='10.0.0.9')
+        self.assertEqual(resp.status_code, 403)
+        resp = APIClient().get(url, REMOTE_ADDR='10.0.0.9', HTTP_X_REAL_IP='127.0.0.1')
+        self.assertEqual(resp.status_code, 403)
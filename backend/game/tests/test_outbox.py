@@ -0,0 +1,123 @@
+# game/tests/test_outbox.py
+
+import json
+from concurrent.futures import Future
+from unittest import mock
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from game import utils, tasks
+from game.publisher import publisher
+from game.models import GameSession, OutboxMessage
+
+
+@override_settings(BROADCAST_OUTBOX=True)
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.session = GameSession.objects.create(code='OUTBX1')
+
+    def dispatch_inline(self):
+        # The broker call normally runs on the publisher's thread pool
+        future = Future()
+        return mock.patch.object(
+            publisher, 'call', side_effect=lambda func: future.set_result(func()) or future
+        )
+
+    def test_broadcast_is_recorded_not_sent(self):
+        with mock.patch.object(utils, 'get_channel_layer') as layer, \
+                mock.patch.object(tasks.dispatch_outbox, 'delay') as delay, \
+                self.dispatch_inline(), self.captureOnCommitCallbacks(execute=True):
+            utils.broadcast_settings_patch(self.session)
+        layer.assert_not_called()
+        delay.assert_called_once()
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.group_name, 'lobby_OUTBX1')
+        event = json.loads(message.event)
+        self.assertEqual(event['type'], 'lobby_update')
+        self.assertEqual(event['data']['op'], 'settings_updated')
+
+    def test_one_dispatch_per_transaction(self):
+        with mock.patch.object(tasks.dispatch_outbox, 'delay') as delay, \
+                self.dispatch_inline(), self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                for _ in range(3):
+                    utils.broadcast_settings_patch(self.session)
+        self.assertEqual(OutboxMessage.objects.count(), 3)
+        self.assertEqual(len(callbacks), 1)
+        delay.assert_called_once()
+
+    def test_rolled_back_write_sends_nothing(self):
+        with self.assertRaises(RuntimeError), \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                utils.broadcast_settings_patch(self.session)
+                raise RuntimeError
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertEqual(callbacks, [])
+
+    def test_publish_sends_in_order_and_deletes(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)('lobby_OUTBX1', channel)
+        for n in range(3):
+            OutboxMessage.objects.create(
+                group_name='lobby_OUTBX1',
+                event=json.dumps({'type': 'lobby_update', 'text': str(n)})
+            )
+
+        self.assertEqual(utils.publish_outbox(batch_size=2), 2)
+        self.assertEqual(utils.publish_outbox(batch_size=2), 1)
+        self.assertEqual(utils.publish_outbox(), 0)
+        received = [async_to_sync(layer.receive)(channel)['text'] for _ in range(3)]
+        self.assertEqual(received, ['0', '1', '2'])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_batch_rows_are_written_in_the_callers_transaction(self):
+        with self.assertRaises(RuntimeError), \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with utils.batch_broadcasts():
+                utils.broadcast_settings_patch(self.session)
+                with transaction.atomic():
+                    utils.broadcast_settings_patch(self.session)
+                    self.assertEqual(OutboxMessage.objects.count(), 2)
+                    raise RuntimeError
+        # The kept event is still published once the block ends
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_batch_is_merged_when_published(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)('lobby_OUTBX1', channel)
+        with mock.patch.object(tasks.dispatch_outbox, 'delay'), utils.batch_broadcasts():
+            utils.broadcast_settings_patch(self.session)
+            utils.broadcast_settings_patch(self.session)
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+        self.assertEqual(utils.publish_outbox(), 2)
+        event = async_to_sync(layer.receive)(channel)
+        data = json.loads(event['text'])
+        self.assertEqual(data['type'], 'batch')
+        self.assertEqual([m['op'] for m in data['messages']], ['settings_updated'] * 2)
+
+    def test_only_one_dispatcher_publishes(self):
+        OutboxMessage.objects.create(group_name='lobby_OUTBX1', event='{"type": "lobby_update"}')
+        with mock.patch.object(utils, '_take_outbox_lock', return_value=False), \
+                mock.patch.object(utils, 'publish_to_layer') as publish, \
+                mock.patch.object(tasks.dispatch_outbox, 'apply_async') as retry:
+            self.assertIsNone(utils.publish_outbox())
+            tasks.dispatch_outbox()
+        publish.assert_not_called()
+        retry.assert_called_once_with(countdown=1)
+        self.assertTrue(OutboxMessage.objects.exists())
+
+    @override_settings(BROADCAST_OUTBOX=False)
+    def test_outbox_can_be_turned_off(self):
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        with mock.patch.object(utils, 'get_channel_layer', return_value=layer):
+            utils.broadcast_settings_patch(self.session)
+        publisher.flush(5)
+        layer.group_send.assert_awaited_once()
+        self.assertFalse(OutboxMessage.objects.exists())
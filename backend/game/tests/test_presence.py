@@ -0,0 +1,134 @@
+# game/tests/test_presence.py
+
+import time
+from datetime import timedelta
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from game import presence, utils
+from game.consumers import LobbyConsumer
+from game.models import GameSession, Participant
+from game.presence import HeartbeatBuffer, MemoryPresence, heartbeats
+
+
+class HeartbeatBufferTests(TestCase):
+    def setUp(self):
+        self.session = GameSession.objects.create(code='PRES01')
+        self.participants = [
+            Participant.objects.create(
+                guest_identifier=f'g{i}', guest_name=f'G{i}', game_session=self.session
+            )
+            for i in range(3)
+        ]
+        self.buffer = HeartbeatBuffer(interval=60)
+
+    def test_pings_are_coalesced_into_one_update(self):
+        later = timezone.now() + timedelta(minutes=5)
+
+        async def ping_all():
+            for _ in range(5):
+                for p in self.participants:
+                    self.buffer.record(p.id, later)
+
+        async_to_sync(ping_all)()
+        # Only last_seen is written, so a concurrent change to points survives
+        Participant.objects.filter(id=self.participants[0].id).update(points=7)
+        with self.assertNumQueries(1):
+            self.assertEqual(async_to_sync(self.buffer.flush)(), 3)
+
+        for p in Participant.objects.filter(game_session=self.session):
+            self.assertEqual(p.last_seen, later)
+        self.assertEqual(Participant.objects.get(id=self.participants[0].id).points, 7)
+
+    def test_empty_flush_writes_nothing(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(async_to_sync(self.buffer.flush)(), 0)
+
+    @override_settings(PRESENCE_BACKEND='memory')
+    def test_consumer_ping_is_buffered(self):
+        heartbeats.drain()
+        consumer = LobbyConsumer()
+        consumer.room_code = 'PRES01'
+        consumer.participant = self.participants[1]
+        with self.assertNumQueries(0):
+            async_to_sync(consumer.receive)('{"type": "ping"}')
+        self.assertEqual(set(heartbeats.drain()), {self.participants[1].id})
+
+    def test_ping_cannot_name_another_participant(self):
+        heartbeats.drain()
+        consumer = LobbyConsumer()
+        async_to_sync(consumer.receive)(
+            f'{{"type": "ping", "participant_id": {self.participants[2].id}}}'
+        )
+        self.assertFalse(heartbeats.drain())
+
+
+@override_settings(PRESENCE_BACKEND='memory', PRESENCE_TTL=45, PRESENCE_GRACE_SECONDS=90)
+class PresenceTests(TestCase):
+    def setUp(self):
+        presence._stores.clear()
+        self.store = presence.get_presence()
+        self.session = GameSession.objects.create(code='PRES02')
+        self.host = Participant.objects.create(
+            guest_identifier='h', guest_name='Host', game_session=self.session, is_host=True
+        )
+        self.guest = Participant.objects.create(
+            guest_identifier='g', guest_name='Guest', game_session=self.session
+        )
+        # Nothing flushed for two minutes
+        Participant.objects.filter(game_session=self.session).update(
+            last_seen=timezone.now() - timedelta(minutes=2)
+        )
+
+    def test_online_needs_an_open_fresh_socket(self):
+        store = MemoryPresence()
+        store.connect('R', 1)
+        store.connect('R', 1)
+        store.connect('R', 2, at=time.time() - 60)
+        self.assertEqual(store.online('R'), {1})
+        store.disconnect('R', 1)
+        self.assertEqual(store.online('R'), {1})
+        store.disconnect('R', 1)
+        self.assertEqual(store.online('R'), set())
+
+    def test_sweep_marks_missing_participants_away(self):
+        self.store.connect('PRES02', self.guest.id)
+        marked = presence.sweep_away()
+        self.assertEqual([p.id for p in marked], [self.host.id])
+
+        self.host.refresh_from_db()
+        self.guest.refresh_from_db()
+        self.assertFalse(self.host.is_active)
+        self.assertTrue(self.host.away)
+        # Host moves to the remaining human, like leave_room
+        self.assertFalse(self.host.is_host)
+        self.assertTrue(self.guest.is_host)
+        self.assertTrue(self.guest.is_active)
+
+    def test_recent_disconnect_is_within_grace(self):
+        self.store.connect('PRES02', self.host.id)
+        self.store.disconnect('PRES02', self.host.id)
+        self.store.connect('PRES02', self.guest.id)
+        self.assertEqual(presence.sweep_away(), [])
+
+    def test_reconnect_brings_participant_back(self):
+        self.session.status = 'guessing'
+        self.session.guessers_expected = 2
+        self.session.save()
+        self.guest.refresh_from_db()
+        utils.mark_away(self.guest)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.guessers_expected, 1)
+
+        self.guest.refresh_from_db()
+        self.assertTrue(utils.mark_back(self.guest))
+        self.guest.refresh_from_db()
+        self.session.refresh_from_db()
+        self.assertTrue(self.guest.is_active)
+        self.assertEqual(self.session.guessers_expected, 2)
+
+    def test_kicked_participant_is_not_brought_back(self):
+        Participant.objects.filter(id=self.guest.id).update(is_active=False)
+        self.guest.refresh_from_db()
+        self.assertFalse(utils.mark_back(self.guest))
@@ -0,0 +1,53 @@
+# game/tests/test_publisher.py
+
+import asyncio, threading
+from django.test import SimpleTestCase
+
+from game.publisher import Publisher
+
+
+class RecordingLayer:
+    def __init__(self, fail_on=None):
+        self.sent = []
+        self.loops = set()
+        self.fail_on = fail_on
+
+    async def group_send(self, group_name, event):
+        # Yield so that overlapping sends would interleave
+        await asyncio.sleep(0)
+        if group_name == self.fail_on:
+            raise ConnectionError('down')
+        self.loops.add(id(asyncio.get_running_loop()))
+        self.sent.append((group_name, event['n']))
+
+
+class PublisherTests(SimpleTestCase):
+    def setUp(self):
+        self.publisher = Publisher()
+        self.layer = RecordingLayer()
+
+    def test_sends_in_order_on_one_loop(self):
+        for n in range(20):
+            self.publisher.publish_many(self.layer, [('lobby_A', {'n': n})])
+        self.publisher.flush(5)
+        self.assertEqual([n for _, n in self.layer.sent], list(range(20)))
+        self.assertEqual(len(self.layer.loops), 1)
+
+    def test_future_reports_failures(self):
+        layer = RecordingLayer(fail_on='lobby_B')
+        future = self.publisher.publish_many(layer, [('lobby_A', {'n': 1}), ('lobby_B', {'n': 2})])
+        with self.assertRaises(ConnectionError):
+            future.result(5)
+        # The loop keeps serving later sends
+        self.assertEqual(self.publisher.publish_many(layer, [('lobby_A', {'n': 3})]).result(5), 1)
+
+    def test_forked_child_starts_its_own_loop(self):
+        self.publisher.publish_many(self.layer, [('lobby_A', {'n': 1})]).result(5)
+        parent_loop = self.publisher.loop
+        self.publisher.pid = -1
+        self.publisher.publish_many(self.layer, [('lobby_A', {'n': 2})]).result(5)
+        self.assertIsNot(self.publisher.loop, parent_loop)
+
+    def test_call_runs_off_the_callers_thread(self):
+        caller = threading.get_ident()
+        self.assertNotEqual(self.publisher.call(threading.get_ident).result(5), caller)
@@ -0,0 +1,53 @@
+# game/tests/test_results_snapshot.py
+
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from game import utils
+from game.models import GameSession, Participant, Character, Question, Round, Message, Guess
+from game.scoring import compute_score_breakdown
+
+
+class CompletedSnapshotTests(TestCase):
+    def completed_session(self, code, players):
+        session = GameSession.objects.create(code=code, status='completed')
+        rnd = Round.objects.create(
+            game_session=session, question=Question.objects.create(text='Q'),
+            round_number=1, end_time=timezone.now() - timedelta(seconds=1)
+        )
+        participants = []
+        for i in range(players):
+            user = User.objects.create_user(username=f'{code}{i}') if i % 2 else None
+            participants.append(Participant.objects.create(
+                user=user, guest_identifier=f'{code}{i}', guest_name=f'G{i}',
+                game_session=session, is_host=(i == 0),
+                assigned_character=Character.objects.create(name=f'{code}C{i}', is_public=True),
+            ))
+            Message.objects.create(participant=participants[-1], round=rnd, text='labas')
+        for guesser in participants:
+            for target in participants:
+                if guesser != target:
+                    Guess.objects.create(
+                        guesser=guesser, guessed_participant=target,
+                        guessed_character=target.assigned_character,
+                        is_correct=(guesser.id + target.id) % 3 == 0,
+                    )
+        return session, participants
+
+    def test_query_count_does_not_grow_with_players(self):
+        # Participants, guesses, rounds answered, question collections
+        for code, players in (('RES003', 3), ('RES008', 8)):
+            session, _ = self.completed_session(code, players)
+            with self.assertNumQueries(4):
+                data = utils.build_lobby_snapshot(session)
+            self.assertEqual(len(data['players']), players)
+
+    def test_results_match_per_participant_scoring(self):
+        session, participants = self.completed_session('RES004', 4)
+        data = utils.build_lobby_snapshot(session)
+        for player, participant in zip(data['players'], participants):
+            breakdown, _ = compute_score_breakdown(participant)
+            self.assertEqual(player['score_breakdown'], breakdown)
+            self.assertEqual(len(player['guesses']), 3)
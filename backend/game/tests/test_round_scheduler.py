@@ -0,0 +1,196 @@
+# game/tests/test_round_scheduler.py
+
+from unittest import mock
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth.models import User
+
+from game import utils, tasks
+from game.models import (
+    GameSession, Participant, Character, QuestionCollection, Question, Round
+)
+
+
+class RoundSchedulerTests(TestCase):
+    def setUp(self):
+        for name in ('schedule_round_end', 'schedule_game_end'):
+            patcher = mock.patch.object(utils, name)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(username='host', password='pw')
+        self.session = GameSession.objects.create(
+            code='SCHED1', status='in_progress', round_count=2
+        )
+        self.host = Participant.objects.create(
+            user=self.user, game_session=self.session, is_host=True,
+            assigned_character=Character.objects.create(name='C1', is_public=True)
+        )
+
+        qc = QuestionCollection.objects.create(name='QC')
+        for i in range(3):
+            qc.questions.add(Question.objects.create(text=f'Q{i}'))
+        self.session.question_collections.add(qc)
+
+        self.round = Round.objects.create(
+            game_session=self.session,
+            question=qc.questions.first(),
+            round_number=1,
+            end_time=timezone.now() - timedelta(seconds=1)
+        )
+        self.session.current_round = 1
+        self.session.next_deadline = self.round.end_time
+        self.session.question_deck = list(
+            qc.questions.exclude(id=self.round.question_id).values_list('id', flat=True)
+        )
+        self.session.save()
+
+    def test_due_wakeup_creates_next_round(self):
+        self.assertTrue(utils.advance_session_round(self.session.id, 1))
+        new_round = self.session.rounds.get(round_number=2)
+        self.schedule_round_end.assert_called_once_with(new_round)
+
+    def test_duplicate_wakeup_is_noop(self):
+        utils.advance_session_round(self.session.id, 1)
+        self.assertFalse(utils.advance_session_round(self.session.id, 1))
+        self.assertEqual(self.session.rounds.count(), 2)
+
+    def test_empty_deck_draws_from_collections(self):
+        unasked = set(self.session.question_deck)
+        self.session.question_deck = []
+        self.session.save()
+        self.assertTrue(utils.advance_session_round(self.session.id, 1))
+        self.assertIn(self.session.rounds.get(round_number=2).question_id, unasked)
+
+    def test_no_questions_left_moves_to_guessing(self):
+        self.session.question_deck = []
+        self.session.save()
+        self.session.question_collections.clear()
+        self.assertTrue(utils.advance_session_round(self.session.id, 1))
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'guessing')
+
+    def test_removed_question_is_skipped(self):
+        removed, kept = self.session.question_deck[-1], self.session.question_deck[0]
+        Question.all_objects.filter(id=removed).delete()
+        self.assertTrue(utils.advance_session_round(self.session.id, 1))
+        self.assertEqual(self.session.rounds.get(round_number=2).question_id, kept)
+
+    def test_stale_round_number_is_noop(self):
+        self.assertFalse(utils.advance_session_round(self.session.id, 7))
+        self.assertEqual(self.session.rounds.count(), 1)
+
+    def test_early_wakeup_reschedules(self):
+        self.round.end_time = timezone.now() + timedelta(seconds=30)
+        self.round.save()
+        self.session.next_deadline = self.round.end_time
+        self.session.save()
+        self.assertFalse(utils.advance_session_round(self.session.id, 1))
+        self.assertEqual(self.session.rounds.count(), 1)
+        self.schedule_round_end.assert_called_once_with(self.round)
+
+    def test_last_round_moves_to_guessing(self):
+        self.session.round_count = 1
+        self.session.save()
+        self.assertTrue(utils.advance_session_round(self.session.id, 1))
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'guessing')
+        self.assertIsNotNone(self.session.guess_deadline)
+        self.assertEqual(self.session.guessers_expected, 1)
+        self.schedule_game_end.assert_called_once()
+
+    def test_end_game_waits_for_deadline(self):
+        self.session.status = 'guessing'
+        self.session.guess_deadline = timezone.now() + timedelta(seconds=30)
+        self.session.next_deadline = self.session.guess_deadline
+        self.session.save()
+        tasks.end_game(self.session.id)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'guessing')
+        self.schedule_game_end.assert_called_once()
+
+    def test_end_game_completes_due_session(self):
+        self.session.status = 'guessing'
+        self.session.guess_deadline = timezone.now() - timedelta(seconds=1)
+        self.session.next_deadline = self.session.guess_deadline
+        self.session.save()
+        tasks.end_game(self.session.id)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'completed')
+        # A second wakeup for the same deadline is harmless
+        tasks.end_game(self.session.id)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'completed')
+
+    def test_next_deadline_follows_phase(self):
+        utils.advance_session_round(self.session.id, 1)
+        self.session.refresh_from_db()
+        self.assertEqual(
+            self.session.next_deadline,
+            self.session.rounds.get(round_number=2).end_time
+        )
+
+    def test_sweep_only_examines_due_sessions(self):
+        later = timezone.now() + timedelta(minutes=5)
+        for i in range(10):
+            GameSession.objects.create(
+                code=f'IDLE{i}', status='in_progress', next_deadline=later
+            )
+        with mock.patch.object(tasks.run_round_check_shard, 'apply_async') as dispatch:
+            utils.check_and_advance_rounds()
+        dispatch.assert_called_once()
+        self.assertEqual(dispatch.call_args.kwargs['args'], ([self.session.id],))
+
+    def test_sweep_partitions_by_room_code(self):
+        past = timezone.now() - timedelta(seconds=1)
+        for i in range(20):
+            GameSession.objects.create(
+                code=f'DUE{i}', status='in_progress', next_deadline=past
+            )
+        with mock.patch.object(tasks.run_round_check_shard, 'apply_async') as dispatch:
+            shards = utils.check_and_advance_rounds()
+        self.assertEqual(dispatch.call_count, len(shards))
+        dispatched = [i for call in dispatch.call_args_list for i in call.kwargs['args'][0]]
+        self.assertEqual(len(dispatched), 21)
+        for shard, session_ids in shards.items():
+            for session in GameSession.objects.filter(id__in=session_ids):
+                self.assertEqual(utils.session_shard(session.code), shard)
+
+    def test_stale_session_copy_cannot_advance_twice(self):
+        stale_copy = GameSession.objects.get(id=self.session.id)
+        self.assertTrue(utils.advance_session(self.session))
+        # A second worker still holding the pre-transition row loses the CAS
+        stale_copy.next_deadline = timezone.now() - timedelta(seconds=1)
+        self.assertFalse(utils.advance_session(stale_copy))
+        self.assertEqual(self.session.rounds.count(), 2)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.current_round, 2)
+
+    def test_wakeup_waits_for_the_row_lock_and_sweep_does_not(self):
+        manager = GameSession.objects
+        with mock.patch.object(manager, 'select_for_update', wraps=manager.select_for_update) as lock:
+            utils.advance_session_round(self.session.id, 1)
+            lock.assert_called_once_with(skip_locked=False)
+            lock.reset_mock()
+            GameSession.objects.filter(id=self.session.id).update(
+                next_deadline=timezone.now() - timedelta(seconds=1)
+            )
+            utils.advance_sessions([self.session.id])
+        lock.assert_called_once_with(skip_locked=True)
+
+    def test_failing_session_does_not_abort_shard(self):
+        other = GameSession.objects.create(
+            code='SCHED2', status='in_progress',
+            next_deadline=timezone.now() - timedelta(seconds=1)
+        )
+        real_advance = utils.advance_session
+
+        def advance(session, now=None):
+            if session.id == other.id:
+                raise RuntimeError('boom')
+            return real_advance(session, now)
+
+        with mock.patch.object(utils, 'advance_session', side_effect=advance):
+            utils.advance_sessions([other.id, self.session.id])
+        self.assertEqual(self.session.rounds.count(), 2)
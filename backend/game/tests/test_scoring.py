@@ -14,7 +14,7 @@ from game.models import (
     Character,
     Question,
 )
-from game.scoring import compute_score_breakdown
+from game.scoring import compute_score_breakdown, compute_session_scores
 
 
 class ComputeScoreBreakdownTests(TestCase):
@@ -214,3 +214,26 @@ class ComputeScoreBreakdownTests(TestCase):
         self.assertIn(zero_entry, breakdown)
 
         self.assertEqual(total, 50)
+
+    def test_session_scores_are_saved_in_bulk(self):
+        # p1 guessed p2 and the NPC, p2 guessed p1
+        for guesser, target, char in (
+            (self.p1, self.p2, self.char2),
+            (self.p1, self.npc, self.char_npc),
+            (self.p2, self.p1, self.char1),
+        ):
+            Guess.objects.create(
+                guesser=guesser, guessed_participant=target,
+                guessed_character=char, is_correct=True
+            )
+
+        # Participants, guesses, rounds answered, one bulk update
+        with self.assertNumQueries(4):
+            scores = compute_session_scores(self.session)
+
+        totals = {p.id: total for p, (_, total) in scores.items()}
+        self.assertEqual(totals[self.p1.id], 100 + 50 + 50)
+        self.assertEqual(totals[self.p2.id], 100 + 50)
+        for participant in Participant.objects.filter(game_session=self.session):
+            self.assertEqual(participant.points, totals[participant.id])
+            self.assertEqual(compute_score_breakdown(participant)[1], totals[participant.id])
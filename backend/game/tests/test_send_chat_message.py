@@ -129,3 +129,67 @@ class SendChatMessageTests(TestCase):
         msgs = Message.objects.filter(round=self.current_round, participant=self.guest)
         self.assertEqual(msgs.count(), 1)
         self.assertEqual(msgs.first().text, 'Hello everyone!')
+
+
+class EarlyRoundEndTests(TestCase):
+    def setUp(self):
+        views.broadcast_chat_message = lambda *args, **kwargs: None
+
+        self.client = APIClient()
+        self.url = reverse('send_chat_message')
+
+        self.session = GameSession.objects.create(
+            code='EARLY1', status='in_progress', early_round_end=True,
+            round_count=2, current_round=1
+        )
+        self.user = User.objects.create_user(username='u1', password='pw')
+        self.host = Participant.objects.create(
+            user=self.user, game_session=self.session, is_host=True
+        )
+        self.guest = Participant.objects.create(
+            guest_identifier='g1', guest_name='Guest', game_session=self.session
+        )
+
+        q1 = Question.objects.create(text='first?', creator=self.user)
+        q2 = Question.objects.create(text='second?', creator=self.user)
+        self.session.question_deck = [q2.id]
+        self.session.next_deadline = timezone.now() + timedelta(seconds=300)
+        self.session.save()
+        self.round = Round.objects.create(
+            game_session=self.session,
+            question=q1,
+            round_number=1,
+            end_time=self.session.next_deadline,
+            expected_answers=2
+        )
+
+    def _send(self, participant, text='hi'):
+        return self.client.post(self.url, {
+            'code': self.session.code,
+            'participant_id': participant.id,
+            'secret': participant.secret,
+            'text': text
+        })
+
+    def test_round_ends_when_everyone_answered(self):
+        self._send(self.host)
+        self.assertFalse(self.session.rounds.filter(round_number=2).exists())
+
+        self._send(self.guest)
+        self.assertTrue(self.session.rounds.filter(round_number=2).exists())
+        self.round.refresh_from_db()
+        self.assertLessEqual(self.round.end_time, timezone.now())
+
+    def test_repeated_messages_count_once(self):
+        self._send(self.host, 'one')
+        self._send(self.host, 'two')
+        self.round.refresh_from_db()
+        self.assertEqual(self.round.answers, 1)
+        self.assertFalse(self.session.rounds.filter(round_number=2).exists())
+
+    def test_mode_off_never_ends_early(self):
+        self.round.expected_answers = 0
+        self.round.save()
+        self._send(self.host)
+        self._send(self.guest)
+        self.assertFalse(self.session.rounds.filter(round_number=2).exists())
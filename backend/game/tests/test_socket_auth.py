@@ -0,0 +1,109 @@
+# game/tests/test_socket_auth.py
+
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from game import utils
+from game.routing import websocket_urlpatterns
+from game.models import GameSession, Participant, Character
+
+
+@override_settings(BROADCAST_OUTBOX=False, PRESENCE_BACKEND='memory')
+class SocketAuthTests(TestCase):
+    def setUp(self):
+        self.session = GameSession.objects.create(code='AUTH01', status='in_progress')
+        self.alice = Participant.objects.create(
+            guest_identifier='a', guest_name='Alice', game_session=self.session,
+            assigned_character=Character.objects.create(name='A', is_public=True)
+        )
+        self.bob = Participant.objects.create(
+            guest_identifier='b', guest_name='Bob', game_session=self.session,
+            assigned_character=Character.objects.create(name='B', is_public=True)
+        )
+
+    async def connect(self, participant, secret=None):
+        path = (
+            f'/ws/lobby/AUTH01/?participant_id={participant.id}'
+            f'&secret={secret or participant.secret}'
+        )
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        connected, code = await communicator.connect()
+        return communicator, connected, code
+
+    async def test_connect_with_credentials(self):
+        communicator, connected, _ = await self.connect(self.alice)
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['type'], 'lobby_snapshot')
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'auth_ok'})
+        await communicator.disconnect()
+
+    async def test_connect_without_credentials_is_refused(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/lobby/AUTH01/')
+        connected, code = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, 4003)
+
+    async def test_wrong_secret_is_refused(self):
+        communicator, connected, code = await self.connect(self.alice, secret='wrong')
+        self.assertFalse(connected)
+        self.assertEqual(code, 4003)
+
+    async def test_private_push_reaches_only_its_participant(self):
+        alice, _, _ = await self.connect(self.alice)
+        bob, _, _ = await self.connect(self.bob)
+        for communicator in (alice, bob):
+            await communicator.receive_json_from()
+            await communicator.receive_json_from()
+
+        await sync_to_async(utils.send_to_participant)(
+            self.alice.id, {'type': 'guess_options', 'options': []}
+        )
+        self.assertEqual((await alice.receive_json_from())['type'], 'guess_options')
+        self.assertTrue(await bob.receive_nothing())
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_reconnect_during_guessing_gets_options(self):
+        await GameSession.objects.filter(id=self.session.id).aupdate(
+            status='guessing', guess_deadline=timezone.now() + timedelta(seconds=60)
+        )
+        communicator, _, _ = await self.connect(self.alice)
+        await communicator.receive_json_from()
+        await communicator.receive_json_from()
+        pushed = await communicator.receive_json_from()
+        self.assertEqual(pushed['type'], 'guess_options')
+        self.assertEqual([o['character_name'] for o in pushed['options']], ['B'])
+        await communicator.disconnect()
+
+
+class PrivatePushTests(TestCase):
+    def setUp(self):
+        self.session = GameSession.objects.create(code='AUTH02', status='guessing')
+        self.players = [
+            Participant.objects.create(
+                guest_identifier=str(i), guest_name=f'P{i}', game_session=self.session,
+                assigned_character=Character.objects.create(name=f'C{i}', is_public=True)
+            )
+            for i in range(2)
+        ]
+
+    def test_guess_options_exclude_own_character(self):
+        options = utils.guess_options_by_participant(self.session)
+        self.assertEqual(
+            [o['character_name'] for o in options[self.players[0].id]], ['C1']
+        )
+
+    def test_finish_game_sends_each_player_their_results(self):
+        with utils.capture_broadcasts() as sent:
+            self.assertTrue(utils.finish_game(self.session))
+        private = {
+            group: event['data'] for group, event in sent if group.startswith('participant_')
+        }
+        self.assertEqual(set(private), {f'participant_{p.id}' for p in self.players})
+        for data in private.values():
+            self.assertEqual(data['type'], 'my_results')
+            self.assertIn('score_breakdown', data)
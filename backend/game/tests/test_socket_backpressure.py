@@ -0,0 +1,112 @@
+# game/tests/test_socket_backpressure.py
+
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from game import metrics
+from game.consumers import LobbyConsumer, SendQueue
+
+
+def frame(n):
+    return {'text_data': str(n)}
+
+
+class SendQueueTests(TestCase):
+    def test_snapshot_replaces_queued_snapshots_and_patches(self):
+        queue = SendQueue(limit=10, grace=5)
+        queue.put(frame(1), 'lobby_snapshot')
+        queue.put(frame(2), 'lobby_patch')
+        queue.put(frame(3), 'chat_update')
+        self.assertEqual(queue.put(frame(4), 'lobby_snapshot'), 2)
+
+        sent = [async_to_sync(queue.get)() for _ in range(len(queue))]
+        self.assertEqual(sent, [frame(3), frame(4)])
+
+    def test_over_budget_after_grace(self):
+        queue = SendQueue(limit=2, grace=5)
+        for n in range(3):
+            queue.put(frame(n), 'chat_update', now=100)
+        self.assertFalse(queue.over_budget(now=104))
+        self.assertTrue(queue.over_budget(now=105))
+
+        # Draining back under the limit resets the clock
+        async_to_sync(queue.get)()
+        self.assertFalse(queue.over_budget(now=200))
+
+    def test_over_budget_at_twice_the_limit(self):
+        queue = SendQueue(limit=2, grace=60)
+        for n in range(4):
+            queue.put(frame(n), 'chat_update', now=100)
+        self.assertTrue(queue.over_budget(now=100))
+
+    def test_unacknowledged_frames_count_once_client_acks(self):
+        queue = SendQueue(limit=2, grace=5)
+        for n in range(3):
+            queue.put(frame(n), 'chat_update', now=100)
+            async_to_sync(queue.get)()
+        # Written straight away, as under Daphne: nothing left queued
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(queue.backlog(), 0)
+
+        queue.ack(1, now=100)
+        self.assertEqual(queue.backlog(), 2)
+        queue.put(frame(3), 'chat_update', now=100)
+        self.assertTrue(queue.over_budget(now=105))
+
+        # Catching up resets the clock
+        async_to_sync(queue.get)()
+        queue.ack(4, now=106)
+        self.assertEqual(queue.backlog(), 0)
+        self.assertFalse(queue.over_budget(now=200))
+
+    def test_ack_cannot_exceed_frames_written(self):
+        queue = SendQueue(limit=2, grace=5)
+        queue.put(frame(1))
+        queue.ack(50)
+        self.assertEqual(queue.acked, 0)
+        self.assertEqual(queue.backlog(), 1)
+
+
+class SlowConsumerTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.consumer = LobbyConsumer()
+        self.consumer.room_code = 'SLOW01'
+        # A writer that never gets to run: everything stays queued
+        self.consumer.outbound = SendQueue(limit=2, grace=60)
+
+    def update(self, kind):
+        event = {'type': 'lobby_update', 'kind': kind, 'text': kind}
+        async_to_sync(self.consumer.lobby_update)(event)
+
+    def test_snapshots_are_coalesced(self):
+        for _ in range(3):
+            self.update('lobby_snapshot')
+        self.assertEqual(len(self.consumer.outbound), 1)
+        self.assertEqual(metrics.snapshot()['socket_frames_coalesced_total']['value'], 2)
+
+    def test_client_that_stops_acking_is_closed(self):
+        self.consumer.outbound = SendQueue(limit=2, grace=60)
+        with mock.patch.object(self.consumer, 'close') as close:
+            async_to_sync(self.consumer.receive)(text_data='{"type": "ack", "frames": 0}')
+            for _ in range(3):
+                self.update('chat_update')
+                # The writer sends each frame at once; the client never acks it
+                async_to_sync(self.consumer.outbound.get)()
+            close.assert_not_called()
+            self.update('chat_update')
+        close.assert_called_once_with(code=LobbyConsumer.SLOW_CLOSE_CODE)
+
+    def test_socket_over_budget_is_closed(self):
+        with mock.patch.object(self.consumer, 'close') as close:
+            for _ in range(5):
+                self.update('chat_update')
+        close.assert_called_once_with(code=LobbyConsumer.SLOW_CLOSE_CODE)
+        self.assertEqual(len(self.consumer.outbound), 0)
+
+        data = metrics.snapshot()
+        self.assertEqual(data['socket_evictions_total']['value'], 1)
+        self.assertEqual(data['socket_frames_dropped_total']['value'], 4)
+        self.assertIn('socket_evictions_total 1', metrics.render_text())
@@ -0,0 +1,102 @@
+# game/tests/test_socket_chat.py
+
+import json
+from unittest import mock
+from datetime import timedelta
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from game.routing import websocket_urlpatterns
+from game.models import (
+    GameSession, Participant, Character, Question, Round, Message, OutboxMessage
+)
+
+
+@override_settings(BROADCAST_OUTBOX=False, PRESENCE_BACKEND='memory')
+class SocketChatTests(TestCase):
+    def setUp(self):
+        self.session = GameSession.objects.create(
+            code='SOCK01', status='in_progress', current_round=1
+        )
+        self.participant = Participant.objects.create(
+            guest_identifier='g1', guest_name='Guest', game_session=self.session,
+            assigned_character=Character.objects.create(name='Alice', is_public=True)
+        )
+        self.round = Round.objects.create(
+            game_session=self.session, question=Question.objects.create(text='Q'),
+            round_number=1, end_time=timezone.now() + timedelta(seconds=60)
+        )
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns),
+            f'/ws/lobby/SOCK01/?participant_id={self.participant.id}&secret={self.participant.secret}'
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        snapshot = json.loads(await communicator.receive_from())
+        self.assertEqual(snapshot['type'], 'lobby_snapshot')
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'auth_ok'})
+        return communicator
+
+    async def test_chat_is_stored_and_fanned_out(self):
+        communicator = await self.connect()
+
+        await communicator.send_json_to({'type': 'chat', 'text': ' Labas '})
+        update = await communicator.receive_json_from()
+        self.assertEqual(update['type'], 'chat_update')
+        self.assertEqual(update['message']['text'], 'Labas')
+        self.assertEqual(update['message']['characterName'], 'Alice')
+        message = await Message.objects.aget()
+        self.assertEqual(message.round_id, self.round.id)
+        await communicator.disconnect()
+
+    async def test_wrong_auth_message_is_rejected(self):
+        communicator = await self.connect()
+        await communicator.send_json_to({
+            'type': 'auth', 'participant_id': self.participant.id, 'secret': 'wrong'
+        })
+        self.assertEqual((await communicator.receive_json_from())['type'], 'error')
+        await communicator.disconnect()
+
+    async def test_chat_between_rounds_is_rejected(self):
+        await Round.objects.filter(id=self.round.id).aupdate(end_time=timezone.now())
+        communicator = await self.connect()
+        await communicator.send_json_to({'type': 'chat', 'text': 'Labas'})
+        reply = await communicator.receive_json_from()
+        self.assertEqual(reply, {'type': 'error', 'error': 'Palaukite sekančio raundo.'})
+        await communicator.disconnect()
+
+    async def test_character_picked_after_connect_is_shown(self):
+        await Participant.objects.filter(id=self.participant.id).aupdate(assigned_character=None)
+        communicator = await self.connect()
+        await Participant.objects.filter(id=self.participant.id).aupdate(
+            assigned_character=await Character.objects.acreate(name='Bob', is_public=True)
+        )
+
+        await communicator.send_json_to({'type': 'chat', 'text': 'Labas'})
+        update = await communicator.receive_json_from()
+        self.assertEqual(update['message']['characterName'], 'Bob')
+        await communicator.disconnect()
+
+    async def test_participant_is_not_reloaded_once_it_has_a_character(self):
+        communicator = await self.connect()
+        manager = Participant.objects
+        with mock.patch.object(manager, 'select_related', wraps=manager.select_related) as reload:
+            for text in ('Labas', 'Kaip sekasi?'):
+                await communicator.send_json_to({'type': 'chat', 'text': text})
+                await communicator.receive_json_from()
+        reload.assert_not_called()
+        await communicator.disconnect()
+
+    @override_settings(BROADCAST_OUTBOX=True)
+    async def test_chat_goes_through_the_outbox(self):
+        communicator = await self.connect()
+        with mock.patch('game.utils._schedule_dispatch'):
+            await communicator.send_json_to({'type': 'chat', 'text': 'Labas'})
+            self.assertTrue(await communicator.receive_nothing())
+        row = await OutboxMessage.objects.aget()
+        self.assertEqual(json.loads(row.event)['data']['message']['text'], 'Labas')
+        await communicator.disconnect()
@@ -0,0 +1,65 @@
+# game/tests/test_socket_protocol.py
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+
+from game import protocol, utils
+from game.routing import websocket_urlpatterns
+from game.models import GameSession, Participant
+
+
+class CompactProtocolTests(TestCase):
+    def test_pack_round_trip_uses_short_keys(self):
+        data = {
+            'type': 'lobby_patch', 'version': 3, 'op': 'player_updated',
+            'player': {'id': 1, 'username': 'Ona', 'characterSelected': True, 'extra': None},
+        }
+        packed = protocol.pack(data)
+        self.assertNotIn(b'characterSelected', packed)
+        # Unknown keys are kept as they are
+        self.assertIn(b'extra', packed)
+        self.assertEqual(protocol.unpack(packed), data)
+
+    @override_settings(SOCKET_COMPACT_PROTOCOL=True)
+    def test_event_carries_both_encodings(self):
+        data = {'type': 'chat_update', 'message': {'text': 'labas'}}
+        event = utils.encode_event({'type': 'lobby_update', 'data': data})
+        self.assertEqual(protocol.unpack(event['bytes']), data)
+        self.assertIn('text', event)
+
+
+@override_settings(SOCKET_COMPACT_PROTOCOL=True, PRESENCE_BACKEND='memory')
+class CompactSocketTests(TestCase):
+    def setUp(self):
+        self.session = GameSession.objects.create(code='PROTO1')
+        self.guest = Participant.objects.create(
+            guest_identifier='g', guest_name='Guest', game_session=self.session, is_host=True
+        )
+        self.path = f'/ws/lobby/PROTO1/?participant_id={self.guest.id}&secret={self.guest.secret}'
+
+    async def test_compact_client_gets_binary_frames(self):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), self.path,
+            subprotocols=[protocol.COMPACT_SUBPROTOCOL]
+        )
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, protocol.COMPACT_SUBPROTOCOL)
+        snapshot = protocol.unpack((await communicator.receive_output())['bytes'])
+        self.assertEqual(snapshot['type'], 'lobby_snapshot')
+        self.assertEqual(snapshot['players'][0]['username'], 'Guest')
+        self.assertEqual(protocol.unpack((await communicator.receive_output())['bytes']), {'type': 'auth_ok'})
+
+        # Client frames are MessagePack too
+        await communicator.send_to(bytes_data=protocol.pack({'type': 'auth', 'participant_id': 0}))
+        reply = protocol.unpack((await communicator.receive_output())['bytes'])
+        self.assertEqual(reply['type'], 'error')
+        await communicator.disconnect()
+
+    async def test_json_stays_the_default(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), self.path)
+        connected, subprotocol = await communicator.connect()
+        self.assertIsNone(subprotocol)
+        self.assertEqual((await communicator.receive_json_from())['type'], 'lobby_snapshot')
+        await communicator.disconnect()
@@ -200,3 +200,50 @@ class StartGameTests(TestCase):
         rounds = Round.objects.filter(game_session=self.session)
         self.assertEqual(rounds.count(), 1)
         self.assertEqual(rounds.first().round_number, 1)
+
+    def test_question_deck_skips_deleted_and_shared_questions(self):
+        self.session.round_count = 2
+        self.session.save()
+        qc1 = QuestionCollection.objects.create(name='QC1')
+        qc2 = QuestionCollection.objects.create(name='QC2')
+        shared = Question.objects.create(text='shared', creator=self.user)
+        deleted = Question.objects.create(text='deleted', creator=self.user)
+        qc1.questions.add(shared, deleted)
+        qc2.questions.add(shared)
+        deleted.delete()
+        self.session.question_collections.add(qc1, qc2)
+
+        # Only one distinct live question for two rounds
+        resp = self.client.post(self.url, {
+            'code': self.session.code,
+            'participant_id': self.host.id,
+            'secret': self.host.secret
+        })
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(
+            resp.json()['error'],
+            'Klausimų kolekcijose nepakanka klausimų pagal nurodytą raundų skaičių.'
+        )
+
+    def test_question_deck_has_no_repeats(self):
+        self.session.round_count = 3
+        self.session.save()
+        qc1 = QuestionCollection.objects.create(name='QC1')
+        qc2 = QuestionCollection.objects.create(name='QC2')
+        for i in range(2):
+            qc1.questions.add(Question.objects.create(text=f"A{i}", creator=self.user))
+            qc2.questions.add(Question.objects.create(text=f"B{i}", creator=self.user))
+        self.session.question_collections.add(qc1, qc2)
+
+        resp = self.client.post(self.url, {
+            'code': self.session.code,
+            'participant_id': self.host.id,
+            'secret': self.host.secret
+        })
+        self.assertEqual(resp.status_code, 200)
+        self.session.refresh_from_db()
+        first = Round.objects.get(game_session=self.session, round_number=1)
+        # Remaining rounds are already drawn, none repeats the first question
+        self.assertEqual(len(self.session.question_deck), 2)
+        self.assertEqual(len(set(self.session.question_deck)), 2)
+        self.assertNotIn(first.question_id, self.session.question_deck)
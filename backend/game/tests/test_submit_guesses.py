@@ -4,6 +4,7 @@ from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth.models import User
+from game import utils
 from game.models import GameSession, Participant, Character, Guess
 
 class SubmitGuessesTests(TestCase):
@@ -37,6 +38,21 @@ class SubmitGuessesTests(TestCase):
         self.other2.assigned_character = self.char3
         self.other2.save()
 
+    def _submit(self, participant, guesses=None):
+        return self.client.post(self.url, {
+            'code': self.session.code,
+            'participant_id': participant.id,
+            'secret': participant.secret,
+            'guesses': guesses or []
+        }, format='json')
+
+    def _leave(self, participant):
+        return self.client.post(reverse('leave_room'), {
+            'code': self.session.code,
+            'participant_id': participant.id,
+            'secret': participant.secret
+        }, format='json')
+
     def test_missing_parameters(self):
         resp = self.client.post(self.url, {}, format='json')
         self.assertEqual(resp.status_code, 404)
@@ -307,4 +323,70 @@ class SubmitGuessesTests(TestCase):
         # should return the same Guess id
         self.assertEqual(ids1, ids2)
         updated = Guess.objects.get(id=ids2[0])
-        self.assertFalse(updated.is_correct)
\ No newline at end of file
+        self.assertFalse(updated.is_correct)
+
+    def test_game_ends_once_everyone_guessed(self):
+        self.session.guessers_expected = 2
+        self.session.save()
+
+        self.assertEqual(self._submit(self.guesser).status_code, 200)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'guessing')
+        self.assertEqual(self.session.guessers_done, 1)
+
+        self.assertEqual(self._submit(self.other1).status_code, 200)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'completed')
+
+    def test_resubmitting_counts_once(self):
+        self.session.guessers_expected = 2
+        self.session.save()
+
+        self._submit(self.guesser)
+        self._submit(self.guesser)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.guessers_done, 1)
+        self.assertEqual(self.session.status, 'guessing')
+
+    def test_leaving_last_pending_guesser_ends_game(self):
+        self.session.guessers_expected = 2
+        self.session.save()
+        self._submit(self.guesser)
+
+        resp = self.client.post(reverse('leave_room'), {
+            'code': self.session.code,
+            'participant_id': self.other1.id,
+            'secret': self.other1.secret
+        }, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'completed')
+
+    def test_leaving_twice_counts_once(self):
+        self.session.guessers_expected = 3
+        self.session.save()
+
+        self._leave(self.other2)
+        self._leave(self.other2)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.guessers_expected, 2)
+
+        self._submit(self.guesser)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'guessing')
+
+    def test_kicking_away_player_counts_once(self):
+        self.session.guessers_expected = 3
+        self.session.save()
+        host = self.guesser
+        Participant.objects.filter(id=host.id).update(is_host=True)
+        utils.mark_away(Participant.objects.get(id=self.other2.id))
+
+        self.client.post(reverse('kick_player'), {
+            'code': self.session.code, 'participant_id': host.id,
+            'secret': host.secret, 'target_participant_id': self.other2.id,
+        }, format='json')
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.guessers_expected, 2)
+        # Kicked for good: reconnecting doesn't bring them back
+        self.assertFalse(utils.mark_back(Participant.objects.get(id=self.other2.id)))
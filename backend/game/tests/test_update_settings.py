@@ -199,3 +199,15 @@ class UpdateSettingsTests(TestCase):
         # session2 should still have no collections
         session2.refresh_from_db()
         assert list(session2.question_collections.all()) == []
+
+    def test_toggle_early_round_end(self):
+        url = reverse('update_settings')
+        resp = self.client.post(url, data=self._payload(early_round_end=True), format='json')
+        assert resp.status_code == 200
+        assert resp.json()['early_round_end'] is True
+        self.session.refresh_from_db()
+        assert self.session.early_round_end
+
+        # Leaving it out keeps the current value
+        resp = self.client.post(url, data=self._payload(), format='json')
+        assert resp.json()['early_round_end'] is True
@@ -18,8 +18,10 @@ from .api_views import (
     send_chat_message,
     submit_guesses,
     available_guess_options,
+    chat_history_view,
     add_npc,
-    kick_player
+    kick_player,
+    scheduler_metrics
 )
 
 router = routers.DefaultRouter()
@@ -41,6 +43,8 @@ urlpatterns = router.urls + [
     path('send_chat_message/', send_chat_message, name='send_chat_message'),
     path('submit_guesses/', submit_guesses, name='submit_guesses'),
     path('available_guess_options/', available_guess_options, name='available_guess_options'),
+    path('chat_history/', chat_history_view, name='chat_history'),
     path('add_npc/', add_npc, name='add_npc'),
     path('kick_player/', kick_player, name='kick_player'),
+    path('metrics/', scheduler_metrics, name='scheduler_metrics'),
 ]
@@ -1,34 +1,357 @@
 # game/utils.py
 
-import random
+import json, random, time, uuid, zlib
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import timedelta
 from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
 from django.utils import timezone
-from .models import GameSession, Round, Message, Guess
+from . import metrics, protocol
+from .publisher import publisher
+from .models import GameSession, Participant, Round, Message, Question, OutboxMessage
 
-def broadcast_lobby_update(session: GameSession):
+# Group the run_game_clock daemon listens on for new deadlines
+GAME_CLOCK_GROUP = 'game_clock'
+
+# Set while broadcasts are being collected by capture_broadcasts()
+_captured_broadcasts = ContextVar('captured_broadcasts', default=None)
+
+@contextmanager
+def capture_broadcasts():
+    """
+    Collect the (group, event) pairs broadcast inside the block instead of
+    sending them. Lets async callers (the game clock) run the sync game logic
+    in a thread and send the events on their own event loop.
+    """
+    sent = []
+    token = _captured_broadcasts.set(sent)
+    try:
+        yield sent
+    finally:
+        _captured_broadcasts.reset(token)
+
+# (histogram, deadline) while broadcasts are measured by measure_broadcast_lag()
+_broadcast_lag = ContextVar('broadcast_lag', default=None)
+
+@contextmanager
+def measure_broadcast_lag(name, deadline):
+    """
+    Record in histogram ``name`` how late the broadcasts made inside the
+    block reach the channel layer, relative to ``deadline``. Outboxed ones
+    carry the deadline and are measured by publish_outbox once published,
+    the rest when the block ends.
+    """
+    token = _broadcast_lag.set((name, deadline))
+    try:
+        yield
+    finally:
+        _broadcast_lag.reset(token)
+    if not settings.BROADCAST_OUTBOX or _captured_broadcasts.get() is not None:
+        metrics.observe_lag(name, deadline, timezone.now())
+
+def _write_outbox(group_name, event, batch=''):
+    name, deadline = _broadcast_lag.get() or ('', None)
+    OutboxMessage.objects.create(
+        group_name=group_name, event=json.dumps(event), batch=batch,
+        lag_metric=name, deadline=deadline
+    )
+
+# Set while broadcasts are being held back by batch_broadcasts()
+_batched_broadcasts = ContextVar('batched_broadcasts', default=None)
+
+@contextmanager
+def batch_broadcasts():
+    """
+    Hold back the broadcasts made inside the block and send them at the end,
+    each group's lobby updates merged into one ordered 'batch' frame. A round
+    start (system message, round update, lobby state) then costs one
+    group_send and one client render instead of three. Nested blocks join
+    the outermost one. Also usable as a decorator.
+
+    With the outbox on, events are still written when they are made, inside
+    the caller's transaction, tagged with the batch; publish_outbox merges
+    them. A write rolled back inside the block so takes its events with it.
+    """
+    if _batched_broadcasts.get() is not None:
+        yield
+        return
+    pending = _Batch()
+    token = _batched_broadcasts.set(pending)
+    try:
+        yield
+    finally:
+        _batched_broadcasts.reset(token)
+        _flush_batch(pending)
+        if pending.outboxed:
+            _schedule_dispatch()
+
+class _Batch(list):
+    """Events held back by one batch_broadcasts() block."""
+    def __init__(self):
+        super().__init__()
+        self.id = uuid.uuid4().hex
+        # Some events went straight to the outbox
+        self.outboxed = False
+
+def merge_lobby_updates(events):
+    """
+    One group's events in order, with its lobby updates merged into a
+    single 'batch' frame (a lone update is kept as is). Other events come
+    first, the merged frame last.
+    """
+    merged, updates = [], []
+    for event in events:
+        if event['type'] == 'lobby_update':
+            updates.append(event['data'])
+        else:
+            merged.append(event)
+    if len(updates) == 1:
+        merged.append({'type': 'lobby_update', 'data': updates[0]})
+    elif updates:
+        merged.append({
+            'type': 'lobby_update',
+            'data': {'type': 'batch', 'messages': updates},
+        })
+    return merged
+
+def _flush_batch(pending):
+    by_group = defaultdict(list)
+    for group_name, event in pending:
+        by_group[group_name].append(event)
+    for group_name, events in by_group.items():
+        for event in merge_lobby_updates(events):
+            _send_now(group_name, event)
+
+def _group_send(group_name, event):
+    batched = _batched_broadcasts.get()
+    if batched is None:
+        _send_now(group_name, event)
+    elif settings.BROADCAST_OUTBOX and _captured_broadcasts.get() is None:
+        # Written now, in the caller's transaction, not when the block ends
+        _write_outbox(group_name, event, batched.id)
+        batched.outboxed = True
+    else:
+        batched.append((group_name, event))
+
+def encode_event(event):
+    """
+    Replace a lobby_update's ``data`` with its JSON ``text``, encoded once
+    here instead of in every consumer of the group. The layer then carries a
+    flat string and LobbyConsumer writes it to the socket as is. With
+    SOCKET_COMPACT_PROTOCOL on, the compact encoding rides along as ``bytes``.
+    ``kind`` is the frame's type, so a consumer can coalesce queued frames
+    without decoding them.
+    """
+    if 'data' not in event:
+        return event
+    encoded = {k: v for k, v in event.items() if k != 'data'}
+    encoded['kind'] = event['data'].get('type')
+    encoded['text'] = json.dumps(event['data'])
+    if settings.SOCKET_COMPACT_PROTOCOL:
+        encoded['bytes'] = protocol.pack(event['data'])
+    return encoded
+
+def _send_now(group_name, event):
+    captured = _captured_broadcasts.get()
+    if captured is not None:
+        # Kept structured; whoever sends them encodes
+        captured.append((group_name, event))
+        return
+    if not settings.BROADCAST_OUTBOX:
+        publish_to_layer([(group_name, encode_event(event))])
+        return
+    # Recorded with the surrounding transaction: a rolled back write sends
+    # nothing, and the caller does not wait for the channel layer
+    _write_outbox(group_name, event)
+    _schedule_dispatch()
+
+# How long publish_outbox waits for its batch to reach the channel layer
+OUTBOX_PUBLISH_TIMEOUT = 30
+
+def publish_to_layer(messages, wait=False):
+    """
+    group_send each (group_name, event) pair, in order, from sync code. Goes
+    through the long-lived publisher loop (game.publisher) so that Redis
+    connections are reused; returns without waiting unless ``wait``.
+    """
     channel_layer = get_channel_layer()
-    group_name = f'lobby_{session.code}'
+    if isinstance(channel_layer, InMemoryChannelLayer):
+        # Its queues belong to this process's loops and are not thread-safe
+        async def send():
+            for group_name, event in messages:
+                await channel_layer.group_send(group_name, event)
+        async_to_sync(send)()
+        return
+    future = publisher.publish_many(channel_layer, messages)
+    if wait:
+        future.result(OUTBOX_PUBLISH_TIMEOUT)
+
+def _schedule_dispatch():
+    """
+    Queue a dispatch_outbox task once the current transaction commits; one
+    per transaction, however many events it wrote. Outside a transaction
+    every call queues one: batch_broadcasts() to send several at once.
+    """
+    if connection.in_atomic_block and any(
+        entry[1] is _dispatch_outbox_soon for entry in connection.run_on_commit
+    ):
+        return
+    transaction.on_commit(_dispatch_outbox_soon)
+
+def _dispatch_outbox_soon():
+    # The broker round trip is made on the publisher's thread pool, not by
+    # the request or task that broadcast
+    from .tasks import dispatch_outbox
+    publisher.call(dispatch_outbox.delay).add_done_callback(_report_dispatch)
+
+def _report_dispatch(future):
+    if future.exception() is not None:
+        # The beat fallback picks the events up
+        print(f"⚠️ Could not queue dispatch_outbox: {future.exception()}")
+
+def _outbox_frames(messages):
+    """(group, event) pairs for outbox rows, adjacent rows of one batch and group merged."""
+    frames, run, run_key = [], [], None
+    for message in messages:
+        key = (message.batch, message.group_name) if message.batch else None
+        if run and (key is None or key != run_key):
+            frames += [(run_key[1], event) for event in merge_lobby_updates(run)]
+            run = []
+        if key is None:
+            frames.append((message.group_name, json.loads(message.event)))
+        else:
+            run.append(json.loads(message.event))
+            run_key = key
+    if run:
+        frames += [(run_key[1], event) for event in merge_lobby_updates(run)]
+    return frames
+
+# Postgres advisory lock held by the one dispatcher publishing the outbox
+OUTBOX_LOCK_ID = zlib.crc32(b'game_outbox')
+
+def _take_outbox_lock():
+    """
+    Take the outbox lock for the current transaction, or return False if
+    another dispatcher holds it. Other databases (sqlite in tests) run a
+    single worker and skip it.
+    """
+    if connection.vendor != 'postgresql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', [OUTBOX_LOCK_ID])
+        return cursor.fetchone()[0]
+
+def publish_outbox(batch_size=100):
+    """
+    Send one batch of outbox events in the order they were written and
+    delete them. Returns the number of events sent, or None if another
+    dispatcher is publishing: only one may, or a later batch could reach
+    the layer before an earlier one.
+    """
+    with transaction.atomic():
+        if not _take_outbox_lock():
+            return None
+        batch = list(OutboxMessage.objects.order_by('id')[:batch_size])
+        if not batch:
+            return 0
+
+        publish_to_layer([
+            (group_name, encode_event(event)) for group_name, event in _outbox_frames(batch)
+        ], wait=True)
+        OutboxMessage.objects.filter(id__in=[m.id for m in batch]).delete()
+    now = timezone.now()
+    # Once per transition, not per event
+    for name, deadline in {(m.lag_metric, m.deadline) for m in batch if m.lag_metric}:
+        metrics.observe_lag(name, deadline, now)
+    return len(batch)
 
+# Lobby snapshots are cached per (session, state_version); a bump makes the
+# old entry unreachable, so the timeout only bounds memory use
+SNAPSHOT_CACHE_TIMEOUT = 10 * 60
+
+def _snapshot_key(session, version):
+    # created_at tells apart sessions that reuse a code (or, in tests, an id)
+    return f'lobby_snapshot:{session.id}:{session.created_at.timestamp()}:{version}'
+
+def bump_state_version(session):
+    """Advance the session's lobby state version and return the new value."""
+    GameSession.objects.filter(id=session.id).update(state_version=F('state_version') + 1)
+    session.refresh_from_db(fields=['state_version'])
+    cache.delete(_snapshot_key(session, session.state_version - 1))
+    return session.state_version
+
+def serialize_player(part):
+    return {
+        'id': part.id,
+        'username': (
+            part.user.username
+            if part.user
+            else (part.guest_name or f"Guest {part.guest_identifier[:8]}")
+        ),
+        'characterSelected': part.assigned_character_id is not None,
+        'is_host': part.is_host,
+        'is_npc': part.is_npc,
+        'is_active': part.is_active,
+    }
+
+def serialize_settings(session):
+    return {
+        'round_length': session.round_length,
+        'round_count': session.round_count,
+        'guess_timer': session.guess_timer,
+        'early_round_end': session.early_round_end,
+        'question_collections': list(
+            session.question_collections.filter(is_deleted=False).values('id', 'name')
+        ),
+    }
+
+def lobby_snapshot(session: GameSession):
+    """
+    The full lobby state at ``session.state_version``, shared by the socket,
+    join_room and broadcasts. Built once per version and cached, so reconnect
+    storms and extra tabs cost one cache read.
+    """
+    key = _snapshot_key(session, session.state_version)
+    data = cache.get(key)
+    if data is None:
+        data = build_lobby_snapshot(session)
+        cache.set(key, data, SNAPSHOT_CACHE_TIMEOUT)
+    return data
+
+def build_lobby_snapshot(session: GameSession):
+    """
+    Build the lobby state. The state is read after ``session.state_version``
+    was, so it is never older than that version (at worst slightly newer,
+    which patches tolerate). Takes a fixed number of queries however many
+    play, results included.
+    """
+    from .scoring import session_guesses, session_score_breakdowns
     players = []
     host_id = None
 
-    for part in session.participants.all().order_by('joined_at'):
+    participants = list(
+        session.participants.all()
+        .order_by('joined_at')
+        .select_related('user', 'assigned_character')
+    )
+    guesses_about = defaultdict(list)
+    if session.status == 'completed':
+        guesses = session_guesses(session)
+        for guess in guesses:
+            guesses_about[guess.guessed_participant_id].append(guess)
+        breakdowns = session_score_breakdowns(session, participants, guesses)
+
+    for part in participants:
         if part.is_host:
             host_id = part.id
 
-        player_data = {
-            'id': part.id,
-            'username': (
-                part.user.username
-                if part.user
-                else (part.guest_name or f"Guest {part.guest_identifier[:8]}")
-            ),
-            'characterSelected': part.assigned_character is not None,
-            'is_host': part.is_host,
-            'is_npc': part.is_npc
-        }
+        player_data = serialize_player(part)
 
         if session.status == 'completed':
             player_data['points'] = part.points
@@ -45,23 +368,18 @@ def broadcast_lobby_update(session: GameSession):
                 player_data['assigned_character'] = None
 
             # how many times others guessed this participant correctly
-            player_data['correctGuesses'] = Guess.objects.filter(
-                guessed_participant=part, is_correct=True
-            ).count()
+            player_data['correctGuesses'] = sum(
+                guess.is_correct for guess in guesses_about[part.id]
+            )
 
             # all guesses about this participant
-            all_guesses = []
-            for guess in Guess.objects.filter(guessed_participant=part):
-                all_guesses.append({
-                    'guesser_id': guess.guesser.id if guess.guesser else None,
-                    'guessed_character_name': guess.guessed_character.name,
-                    'is_correct': guess.is_correct,
-                })
-            player_data['guesses'] = all_guesses
-
-            from .scoring import compute_score_breakdown
-            breakdown, _ = compute_score_breakdown(part)
-            player_data['score_breakdown'] = breakdown
+            player_data['guesses'] = [{
+                'guesser_id': guess.guesser_id,
+                'guessed_character_name': guess.guessed_character.name,
+                'is_correct': guess.is_correct,
+            } for guess in guesses_about[part.id]]
+
+            player_data['score_breakdown'] = breakdowns[part.id][0]
 
         else:
             # no character details before game ends
@@ -69,36 +387,103 @@ def broadcast_lobby_update(session: GameSession):
 
         players.append(player_data)
 
-    collections_list = list(session.question_collections.values('id', 'name'))
-
-    data = {
+    return {
+        'type': 'lobby_snapshot',
+        'version': session.state_version,
         'code': session.code,
         'players': players,
         'status': session.status,
-        'round_length': session.round_length,
-        'round_count': session.round_count,
-        'guess_timer': session.guess_timer,
         'guess_deadline': session.guess_deadline.isoformat()
                          if session.guess_deadline else None,
-        'question_collections': collections_list,
         'host_id': host_id,
+        **serialize_settings(session),
     }
 
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {'type': 'lobby_update', 'data': data}
-    )
+def broadcast_lobby_update(session: GameSession):
+    """
+    Send the whole lobby to the room. Used for phase changes, where most of
+    the state changes at once; smaller edits go through broadcast_lobby_patch.
+    """
+    bump_state_version(session)
+    data = lobby_snapshot(session)
+    _group_send(f'lobby_{session.code}', {'type': 'lobby_update', 'data': data})
 
+def broadcast_lobby_patch(session: GameSession, op, **fields):
+    """
+    Send one lobby change to the room as a versioned patch. Clients apply
+    patches in version order and ask for a snapshot when they see a gap.
 
-def broadcast_chat_message(room_code, message_obj):
-    channel_layer = get_channel_layer()
-    participant = message_obj.participant
-    character = participant.assigned_character
+    ops: player_added / player_updated (``player``), player_removed
+    (``player_id``), settings_updated (``settings``).
+    """
+    version = bump_state_version(session)
+    data = {'type': 'lobby_patch', 'version': version, 'op': op, **fields}
+    _group_send(f'lobby_{session.code}', {'type': 'lobby_update', 'data': data})
 
-    data = {
+def broadcast_player_patch(session, participant, op='player_updated'):
+    broadcast_lobby_patch(session, op, player=serialize_player(participant))
+
+def broadcast_settings_patch(session):
+    broadcast_lobby_patch(session, 'settings_updated', settings=serialize_settings(session))
+
+def collection_changed(collection):
+    """
+    ``collection`` was renamed or deleted. Pending lobbies that picked it get
+    their new settings; for the others the snapshot cache is invalidated.
+    """
+    for session in collection.game_sessions.all():
+        if session.status == 'pending':
+            broadcast_settings_patch(session)
+        else:
+            bump_state_version(session)
+
+def broadcast_player_left(session, participant_id, participant):
+    """Removed from a pending lobby, shown as inactive once the game has started."""
+    if session.status == 'pending':
+        broadcast_lobby_patch(session, 'player_removed', player_id=participant_id)
+    else:
+        broadcast_player_patch(session, participant)
+
+
+def participant_group(participant_id):
+    """Private channel group of one participant's sockets."""
+    return f'participant_{participant_id}'
+
+def send_to_participant(participant_id, data):
+    _group_send(participant_group(participant_id), {'type': 'lobby_update', 'data': data})
+
+def guess_options_by_participant(session):
+    """
+    {human participant id: characters they can guess}, i.e. every assigned
+    character but their own, from one query.
+    """
+    participants = list(session.participants.select_related('assigned_character'))
+    characters = {}
+    for part in participants:
+        char = part.assigned_character
+        if char:
+            characters[char.id] = {
+                'character_id': char.id,
+                'character_name': char.name,
+                'character_image': char.image.url if char.image else None,
+            }
+    return {
+        part.id: [c for c in characters.values() if c['character_id'] != part.assigned_character_id]
+        for part in participants if not part.is_npc
+    }
+
+def push_guess_options(session):
+    """Send each human their guess options over their private channel."""
+    for participant_id, options in guess_options_by_participant(session).items():
+        send_to_participant(participant_id, {'type': 'guess_options', 'options': options})
+
+def chat_message_data(message_obj):
+    character = message_obj.participant.assigned_character
+    return {
         'type': 'chat_update',
         'message': {
             'id': message_obj.id,
+            'seq': message_obj.seq,
             'text': message_obj.text,
             'sentAt': message_obj.sent_at.isoformat(),
             'characterName': character.name if character else '???',
@@ -106,16 +491,55 @@ def broadcast_chat_message(room_code, message_obj):
         }
     }
 
-    async_to_sync(channel_layer.group_send)(
-        f'lobby_{room_code}',
-        {
-            'type': 'lobby_update',
-            'data': data
-        }
+def broadcast_chat_message(room_code, message_obj):
+    data = chat_message_data(message_obj)
+    _group_send(f'lobby_{room_code}', {'type': 'lobby_update', 'data': data})
+
+CHAT_HISTORY_PAGE = 100
+CHAT_HISTORY_MAX_PAGE = 200
+
+def history_message_data(msg):
+    """A stored message as join_room and chat_history list it."""
+    char = msg.participant.assigned_character if msg.participant else None
+    if char:
+        img = char.image.url if char.image else None
+        name = char.name
+    else:
+        img = None
+        name = 'System' if msg.message_type == 'system' else None
+    return {
+        'id': msg.id,
+        'seq': msg.seq,
+        'text': msg.text,
+        'sentAt': msg.sent_at.isoformat(),
+        'roundNumber': msg.round.round_number,
+        'system': (msg.message_type == 'system'),
+        'characterImage': img,
+        'characterName': name,
+    }
+
+def chat_history(session, after_seq=0, limit=CHAT_HISTORY_PAGE):
+    """
+    The room's messages after ``after_seq``, oldest first, at most ``limit``
+    of them. Clients pass the last seq they hold and page on while
+    ``has_more``; ``last_seq`` is the cursor for the next page.
+    """
+    limit = max(1, min(limit, CHAT_HISTORY_MAX_PAGE))
+    rows = list(
+        Message.objects
+        .filter(game_session=session, seq__gt=after_seq)
+        .select_related('round', 'participant__assigned_character')
+        .order_by('seq')[:limit + 1]
     )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'messages': [history_message_data(msg) for msg in rows],
+        'has_more': has_more,
+        'last_seq': rows[-1].seq if rows else after_seq,
+    }
 
 def broadcast_round_update(room_code, round_obj):
-    channel_layer = get_channel_layer()
     data = {
          'type': 'round_update',
          'round': {
@@ -124,67 +548,415 @@ def broadcast_round_update(room_code, round_obj):
               'end_time': round_obj.end_time.isoformat(),
          }
     }
-    async_to_sync(channel_layer.group_send)(
-         f'lobby_{room_code}',
-         {'type': 'lobby_update', 'data': data}
+    _group_send(f'lobby_{room_code}', {'type': 'lobby_update', 'data': data})
+
+def build_question_deck(session):
+    """
+    Shuffled ids of the questions the session's rounds will ask, drawn once
+    from all of its live collections without repeats. Rounds pop from the end.
+    """
+    question_ids = list(
+        Question.objects
+        .filter(collections__in=session.question_collections.filter(is_deleted=False))
+        .values_list('id', flat=True)
+        .distinct()
+    )
+    random.shuffle(question_ids)
+    return question_ids[:session.round_count]
+
+def session_shard(code):
+    """Stable shard number of a room, from a hash of its code."""
+    return zlib.crc32(code.encode()) % settings.ROUND_CHECK_SHARDS
+
+def shard_queue(shard):
+    """Queue for a shard's round work, or None for the default queue."""
+    prefix = settings.ROUND_CHECK_QUEUE_PREFIX
+    return f"{prefix}{shard}" if prefix else None
+
+def _notify_game_clock(session):
+    """Hand the session's new deadline to the run_game_clock daemon."""
+    _group_send(GAME_CLOCK_GROUP, {
+        'type': 'clock.deadline',
+        'session_id': session.id,
+        'status': session.status,
+        'round_number': session.current_round,
+        'deadline': session.next_deadline.isoformat(),
+    })
+
+def schedule_round_end(round_obj):
+    """Queue the transition out of ``round_obj`` for exactly its end_time."""
+    session = round_obj.game_session
+    if settings.GAME_CLOCK == 'daemon':
+        _notify_game_clock(session)
+        return
+    from .tasks import advance_round
+    advance_round.apply_async(
+        args=(round_obj.game_session_id, round_obj.round_number),
+        eta=round_obj.end_time,
+        queue=shard_queue(session_shard(session.code))
+    )
+
+def schedule_game_end(session):
+    """Queue the end of the guessing phase for exactly the guess deadline."""
+    if settings.GAME_CLOCK == 'daemon':
+        _notify_game_clock(session)
+        return
+    from .tasks import end_game
+    end_game.apply_async(
+        args=(session.id,),
+        eta=session.next_deadline,
+        queue=shard_queue(session_shard(session.code))
     )
 
 def check_and_advance_rounds():
+    # Fallback sweep: rounds are normally advanced by the ETA task queued in
+    # schedule_round_end, this only catches wakeups lost by the broker.
+    # The (status, next_deadline) index keeps this proportional to due sessions.
+    # Due sessions are split into shards by room code and each shard is
+    # advanced by its own task, so a slow room only delays its own shard.
+    from .tasks import run_round_check_shard
+    started = time.perf_counter()
     now = timezone.now()
-    sessions = GameSession.objects.filter(status='in_progress')
+    due = GameSession.objects.filter(
+        status='in_progress', next_deadline__lte=now
+    ).values_list('id', 'code')
 
+    shards = defaultdict(list)
+    for session_id, code in due:
+        shards[session_shard(code)].append(session_id)
+    for shard, session_ids in shards.items():
+        run_round_check_shard.apply_async(args=(session_ids,), queue=shard_queue(shard))
+    metrics.observe('tick_scan_duration_seconds', time.perf_counter() - started)
+    metrics.observe('tick_sessions_examined', len(due))
+    return shards
+
+def advance_sessions(session_ids):
+    """Advance every due session among ``session_ids`` (one shard's work)."""
+    now = timezone.now()
+    sessions = GameSession.objects.filter(
+        id__in=session_ids, status='in_progress', next_deadline__lte=now
+    )
     for session in sessions:
-        latest_round = (
-            Round.objects
-            .filter(game_session=session)
-            .order_by('-round_number')
+        # One broken session must not hold up every other room in the shard
+        try:
+            advance_session(session, now)
+        except Exception as e:
+            print(f"⚠️ Could not advance session {session.code}: {e}")
+
+def advance_session_round(session_id, round_number):
+    """
+    Deadline wakeup for round ``round_number`` of a session. Stale wakeups
+    (the session already moved past that round or left 'in_progress') and
+    duplicate ones are ignored.
+    """
+    try:
+        session = GameSession.objects.get(id=session_id)
+    except GameSession.DoesNotExist:
+        return False
+    if session.status != 'in_progress' or session.current_round != round_number:
+        return False
+    if session.next_deadline and session.next_deadline > timezone.now():
+        # Woke up early (clock skew between hosts), try again on time
+        schedule_round_end(session.rounds.get(round_number=round_number))
+        return False
+    return advance_session(session, wait=True)
+
+def advance_session(session, now=None, wait=False):
+    """
+    Move an 'in_progress' session on if its current round is over: create the
+    next round or, after the last one, switch to the guessing phase.
+
+    The transition is a compare-and-set on (status, current_round) under a
+    row lock, so concurrent workers holding the same session apply it at most
+    once. Sweeps skip a session whose row is locked; the per-session paths
+    pass ``wait`` and block instead, since the lock is usually held only
+    briefly (Message.save, bump_state_version) and nothing else would retry.
+    Returns True if this call made the transition.
+    """
+    now = now or timezone.now()
+    new_round = None
+
+    with transaction.atomic():
+        locked = (
+            GameSession.objects
+            .select_for_update(skip_locked=not wait)
+            .filter(id=session.id, status='in_progress', current_round=session.current_round)
             .first()
         )
-        # If there is a round and its end_time has passed, mark it as ended
-        if latest_round:
-            if latest_round.end_time <= now:
-                # Send a round-end system message
-                # send_system_message(latest_round, f"Raundas {latest_round.round_number} pasibaigė.")
-                pass
-            else:
-                # The current round is still ongoing
-                print(f"⏳ Round {latest_round.round_number} in session {session.code} is still ongoing.")
-                continue
+        if locked is None:
+            # Already advanced or finished (or, without wait, being advanced)
+            return False
+        session = locked
+        if session.next_deadline and session.next_deadline > now:
+            # The current round is still ongoing
+            return False
+        scheduled = session.next_deadline
 
-        next_round_number = (latest_round.round_number + 1) if latest_round else 1
-        if next_round_number > session.round_count:
+        next_round_number = session.current_round + 1
+        question_id = None
+        if next_round_number <= session.round_count:
+            question_id = pop_question(session)
+            if question_id is None:
+                print(f"⚠️ Session {session.code} ran out of questions before round {next_round_number}.")
+        if question_id is None:
             print(f"✅ Session {session.code} finished all rounds. Moving to 'guessing'.")
             session.status = 'guessing'
             session.guess_deadline = now + timedelta(seconds=session.guess_timer)
+            session.next_deadline = session.guess_deadline
+            session.guessers_expected = session.participants.filter(
+                is_active=True, is_npc=False
+            ).count()
+            session.guessers_done = 0
             session.save()
+        else:
+            end_time = now + timedelta(seconds=session.round_length)
+            new_round = Round.objects.create(
+                game_session=session,
+                question_id=question_id,
+                round_number=next_round_number,
+                end_time=end_time,
+                expected_answers=expected_answer_count(session)
+            )
+            session.current_round = next_round_number
+            session.next_deadline = end_time
+            session.save(update_fields=['current_round', 'next_deadline', 'question_deck'])
+
+    metrics.observe_lag('round_transition_lag_seconds', scheduled, timezone.now())
+    with measure_broadcast_lag('round_broadcast_lag_seconds', scheduled), batch_broadcasts():
+        if new_round is None:
+            schedule_game_end(session)
             broadcast_lobby_update(session)
-            continue
-
-        collections = list(session.question_collections.all())
-        question = None
-        if collections:
-            collection = random.choice(collections)
-            questions = list(collection.questions.exclude(round__game_session=session))
-            if questions:
-                question = random.choice(questions)
-        end_time = now + timedelta(seconds=session.round_length)
-        new_round = Round.objects.create(
-            game_session=session,
-            question=question,
-            round_number=next_round_number,
-            end_time=end_time
-        )
-        print(f"🌀 Created round {new_round.round_number} in session {session.code}")
+            push_guess_options(session)
+        else:
+            print(f"🌀 Created round {new_round.round_number} in session {session.code}")
+            schedule_round_end(new_round)
+
+            send_system_message(new_round,
+                f"<p><strong>{new_round.round_number} raundas</strong></p><p>{new_round.question.text if new_round.question else 'Nėra klausimo.'}</p>"
+            )
+
+            from .tasks import schedule_npc_responses
+            schedule_npc_responses.delay(new_round.id)
+
+            broadcast_round_update(session.code, new_round)
+    return True
+
+def pop_question(session):
+    """
+    Take the next question id off ``session.question_deck``, skipping ids
+    whose question has since been removed. Decks backfilled by migration
+    0026 can run out early; then any question of the session's collections
+    not asked yet is drawn, like before decks. None if there is none left.
+    """
+    deck = session.question_deck
+    existing = set(Question.all_objects.filter(id__in=deck).values_list('id', flat=True))
+    while deck:
+        question_id = deck.pop()
+        if question_id in existing:
+            return question_id
+    return (
+        Question.objects
+        .filter(collections__in=session.question_collections.filter(is_deleted=False))
+        .exclude(round__game_session=session)
+        .values_list('id', flat=True)
+        .order_by('?')
+        .first()
+    )
+
+def expected_answer_count(session):
+    """Answers that end a round early; 0 (never) unless the room opted in."""
+    if not session.early_round_end:
+        return 0
+    return session.participants.filter(is_active=True).count()
+
+def record_answer(session, participant, round_obj):
+    """
+    Count ``participant``'s first chat message in ``round_obj`` and end the
+    round early once everyone expected has answered. Only the first message
+    per participant and round touches the database.
+    """
+    if not round_obj.expected_answers or participant.last_answered_round == round_obj.round_number:
+        return False
+    first = Participant.objects.filter(id=participant.id).exclude(
+        last_answered_round=round_obj.round_number
+    ).update(last_answered_round=round_obj.round_number)
+    participant.last_answered_round = round_obj.round_number
+    if not first:
+        return False
+    Round.objects.filter(id=round_obj.id).update(answers=F('answers') + 1)
+    round_obj.refresh_from_db(fields=['answers'])
+    if round_obj.answers < round_obj.expected_answers:
+        return False
+    return end_round_early(session, round_obj)
 
-        send_system_message(new_round,
-            f"<p><strong>{new_round.round_number} raundas</strong></p><p>{new_round.question.text if new_round.question else 'Nėra klausimo.'}</p>"
+def end_round_early(session, round_obj):
+    """Cut ``round_obj`` short and advance, if it is still the current round."""
+    now = timezone.now()
+    with transaction.atomic():
+        moved = GameSession.objects.filter(
+            id=session.id, status='in_progress', current_round=round_obj.round_number
+        ).update(next_deadline=now)
+        if not moved:
+            return False
+        Round.objects.filter(id=round_obj.id).update(end_time=now)
+    print(f"⏩ Everyone answered round {round_obj.round_number} in session {session.code}.")
+    session.refresh_from_db()
+    return advance_session(session, now, wait=True)
+
+def record_guesser(session, participant):
+    """
+    Count ``participant``'s first guess submission and end the guessing
+    phase early once every expected guesser is done. Later submissions
+    cost no queries.
+    """
+    if participant.has_guessed or participant.is_npc or not participant.is_active:
+        return False
+    if not Participant.objects.filter(id=participant.id, has_guessed=False).update(has_guessed=True):
+        return False
+    participant.has_guessed = True
+    GameSession.objects.filter(id=session.id).update(guessers_done=F('guessers_done') + 1)
+    return _finish_if_all_guessed(session)
+
+def deactivate(participant):
+    """
+    Mark ``participant`` inactive for good (left or kicked), clearing
+    ``away`` so a reconnect doesn't bring them back. Returns whether this
+    call is the one that made them inactive.
+    """
+    changed = Participant.objects.filter(id=participant.id, is_active=True).update(
+        is_active=False, away=False
+    )
+    if not changed:
+        Participant.objects.filter(id=participant.id, away=True).update(away=False)
+    participant.is_active = False
+    participant.away = False
+    return bool(changed)
+
+def remove_guesser(session, participant):
+    """
+    A participant who had not guessed yet left the guessing phase. Call only
+    from the branch that actually made them inactive (see deactivate).
+    """
+    if session.status != 'guessing' or participant.has_guessed or participant.is_npc:
+        return False
+    GameSession.objects.filter(id=session.id, guessers_expected__gt=0).update(
+        guessers_expected=F('guessers_expected') - 1
+    )
+    return _finish_if_all_guessed(session)
+
+def mark_away(participant):
+    """
+    Presence lost ``participant`` for longer than the grace period: make
+    them inactive like a leave, but keep them (flagged ``away``) so that a
+    reconnect brings them back.
+    """
+    session = participant.game_session
+    if not Participant.objects.filter(id=participant.id, is_active=True).update(
+        is_active=False, away=True
+    ):
+        return False
+    participant.is_active = False
+    participant.away = True
+    print(f"💤 {participant} is away from session {session.code}.")
+
+    with batch_broadcasts():
+        if participant.is_host:
+            # Like leave_room, hand host to the oldest active human
+            new_host = session.participants.filter(
+                is_active=True, is_npc=False
+            ).order_by('joined_at').first()
+            if new_host:
+                Participant.objects.filter(id=participant.id).update(is_host=False)
+                participant.is_host = False
+                new_host.is_host = True
+                new_host.save(update_fields=['is_host'])
+                broadcast_player_patch(session, new_host)
+        broadcast_player_patch(session, participant)
+        remove_guesser(session, participant)
+    return True
+
+def mark_back(participant):
+    """An away participant reconnected; make them active again if there is room."""
+    if not participant.away:
+        return False
+    session = participant.game_session
+    if session.status == 'completed' or session.participants.filter(is_active=True).count() >= 8:
+        return False
+    if not Participant.objects.filter(id=participant.id, away=True).update(
+        is_active=True, away=False
+    ):
+        return False
+    participant.is_active = True
+    participant.away = False
+    if session.status == 'guessing' and not participant.has_guessed:
+        # Undo remove_guesser
+        GameSession.objects.filter(id=session.id, status='guessing').update(
+            guessers_expected=F('guessers_expected') + 1
         )
+    print(f"👋 {participant} is back in session {session.code}.")
+    broadcast_player_patch(session, participant)
+    return True
 
-        from .tasks import schedule_npc_responses
-        schedule_npc_responses.delay(new_round.id)
+def _finish_if_all_guessed(session):
+    session.refresh_from_db(fields=['status', 'guessers_expected', 'guessers_done'])
+    # Nobody expected (all humans left) is left to the deadline
+    if session.status != 'guessing' or session.guessers_expected == 0:
+        return False
+    if session.guessers_done >= session.guessers_expected:
+        print(f"🎯 Everyone in session {session.code} has guessed.")
+        return finish_game(session, wait=True)
+    return False
 
-        broadcast_round_update(session.code, new_round)
+def end_session_game(session_id):
+    """
+    Deadline wakeup for the guessing phase. Stale wakeups (already finished,
+    or the deadline moved) are ignored, early ones reschedule.
+    """
+    try:
+        session = GameSession.objects.get(id=session_id)
+    except GameSession.DoesNotExist:
+        return False
+    if session.status != 'guessing' or not session.next_deadline:
+        return False
+    if session.next_deadline > timezone.now():
+        schedule_game_end(session)
+        return False
+    return finish_game(session, wait=True)
+
+def finish_game(session, wait=False):
+    """
+    Score every participant and close the guessing phase. Locked and
+    conditional on status like advance_session, so it runs once per session;
+    ``wait`` as there.
+    """
+    from .scoring import compute_session_scores
+    with transaction.atomic():
+        locked = (
+            GameSession.objects
+            .select_for_update(skip_locked=not wait)
+            .filter(id=session.id, status='guessing')
+            .first()
+        )
+        if locked is None:
+            return False
+        session = locked
+        scheduled = session.next_deadline
+        print(f"Ending game for session {session.code}")
+        results = {}
+        for participant, (breakdown, total) in compute_session_scores(session).items():
+            if not participant.is_npc:
+                results[participant.id] = {
+                    'type': 'my_results', 'points': total, 'score_breakdown': breakdown
+                }
+        session.status = 'completed'
+        session.next_deadline = None
+        session.save()
+    metrics.observe_lag('guess_transition_lag_seconds', scheduled, timezone.now())
+    with measure_broadcast_lag('guess_broadcast_lag_seconds', scheduled), batch_broadcasts():
         broadcast_lobby_update(session)
+        for participant_id, data in results.items():
+            send_to_participant(participant_id, data)
+    return True
 
 def send_system_message(round_obj, text):
     message = Message.objects.create(
@@ -193,11 +965,11 @@ def send_system_message(round_obj, text):
         text=text,
         message_type='system'
     )
-    channel_layer = get_channel_layer()
     data = {
         'type': 'chat_update',
         'message': {
             'id': message.id,
+            'seq': message.seq,
             'text': message.text,
             'sentAt': message.sent_at.isoformat(),
             'system': True,
@@ -205,7 +977,4 @@ def send_system_message(round_obj, text):
             'question': round_obj.question.text if (round_obj and round_obj.question) else ""
         }
     }
-    async_to_sync(channel_layer.group_send)(
-        f'lobby_{round_obj.game_session.code}',
-        {'type': 'lobby_update', 'data': data}
-    )
\ No newline at end of file
+    _group_send(f'lobby_{round_obj.game_session.code}', {'type': 'lobby_update', 'data': data})
\ No newline at end of file